@@ -1,23 +1,26 @@
 from flask import Flask, request, abort
-import json
+import os
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 
-import sys
-print(sys.executable)
+# shared with the coffee shop backend, see auth_kit/ at the root of the
+# repository
+from auth_kit.jwks import JWKSCache, JWKSError
+from auth_kit.permissions import AuthError, check_permissions, compile_permissions
+from auth_kit.token_cache import TokenCache, verify_token as verify_cached_token
 
 app = Flask(__name__)
 
-AUTH0_DOMAIN = 'fsnd-leogovan.eu.auth0.com'
+# all three can be pointed at an auth_kit.local_issuer.LocalIssuer to work offline
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'fsnd-leogovan.eu.auth0.com')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = 'image'
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'image')
+# or at a local jwks.json (path or file:// URL)
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
 
-
-class AuthError(Exception):
-    def __init__(self, error, status_code):
-        self.error = error
-        self.status_code = status_code
+jwks_cache = JWKSCache(JWKS_URL)
+# payloads and permission sets of already verified tokens, until they expire
+token_cache = TokenCache()
 
 
 def get_token_auth_header():
@@ -54,25 +57,14 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -107,50 +99,42 @@ def verify_decode_jwt(token):
             }, 400)
 
 
-def check_permissions(permission, payload):
-    print("I am payload: ", payload)
-    print("I am permission: ", permission)
-    print("I am payload['permissions']", payload['permissions'])
-    if 'permissions' not in payload:
-        raise AuthError({
-            'code': 'invalid_claims',
-            'description': 'Permissions not included in JWT.'
-            }, 400)
-
-    if permission not in payload['permissions']:
-        abort(403)
-        # raise AuthError({
-        #     'code': 'unauthorized',
-        #     'description': 'Permission not found.'
-        #     }, 403)
-    return True
+def verify_token(token):
+    """verify_decode_jwt() behind token_cache, returns a VerifiedToken
+    """
+    return verify_cached_token(token_cache, token, verify_decode_jwt)
 
 
+def requires_auth(*permissions):
+    check = compile_permissions(permissions)
 
-def requires_auth(permission=""):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
             try:
-                payload = verify_decode_jwt(token)
+                verified = verify_token(token)
+            except JWKSError:
+                # the issuer's keys could not be fetched
+                abort(503)
             except:
                 abort(401)
-            
-            check_permissions(permission, payload)
 
-            return f(payload, *args, **kwargs)
+            try:
+                check(verified.permissions)
+            except AuthError as e:
+                abort(e.status_code)
+
+            return f(verified.payload, *args, **kwargs)
 
         return wrapper
     return requires_auth_decorator
 
 @app.route('/')
 def welcome():
-    print("At least this works")
     return 'Something works'
 
 @app.route('/headers')
 @requires_auth('post: images')
 def headers(payload):
-    print(payload)
     return 'Access Granted'
\ No newline at end of file
@@ -0,0 +1,12 @@
+'''
+Token verification helpers shared by BasicFlaskAuth and the coffee shop
+backend:
+
+    jwks          the issuer's signing keys, cached by kid
+    token_cache   verified tokens, kept until they expire
+    permissions   AuthError and the permission checks of requires_auth
+    local_issuer  an offline stand-in for the Auth0 tenant
+
+Both projects install it from the root of the repository (setup.py),
+through their requirements.txt.
+'''
@@ -0,0 +1,160 @@
+import json
+import pathlib
+import re
+import threading
+import time
+from urllib.request import urlopen
+
+
+class JWKSError(Exception):
+    pass
+
+
+'''
+JWKSCache
+    the signing keys of a JSON Web Key Set, kept in memory as a dict keyed
+    by `kid` so verifying a token needs neither a network round trip nor a
+    scan of the key list.
+
+    `source` is the jwks.json URL, or a file:// URL or plain path so tests
+    and offline development can use a local key set. Keys are kept for the
+    max-age of the response's Cache-Control header (`default_ttl` without
+    one). Once `refresh_ahead` of that time has passed, the next lookup
+    starts a refetch in a background thread and keeps answering from the
+    current keys; only an expired cache makes a lookup wait.
+
+    A token with an unknown `kid` (e.g. right after the issuer rotated its
+    keys) triggers an immediate refetch. Fetches, successful or not, are
+    started at most once every `min_refetch_interval` seconds, so random
+    kids or an unreachable issuer can't make every request wait on the
+    network. Concurrent lookups share one fetch.
+
+    get_key() raises JWKSError when there are no keys to check a token
+    against; callers answer with a 503 rather than letting the fetch error
+    through.
+'''
+class JWKSCache(object):
+    def __init__(self, source, default_ttl=3600, refresh_ahead=0.8,
+                 min_refetch_interval=30, timeout=5):
+        self.source = source
+        self.default_ttl = default_ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = None
+        # start of the last fetch, whatever its outcome
+        self._attempted_at = None
+        self._ttl = default_ttl
+        self._lock = threading.Lock()
+        self._fetching = None
+
+    def fetch(self):
+        '''
+        reads the key set from the source; returns ({kid: key}, ttl)
+        '''
+        url = self.source
+        if '://' not in url:
+            url = pathlib.Path(url).resolve().as_uri()
+        with urlopen(url, timeout=self.timeout) as response:
+            jwks = json.loads(response.read())
+            cache_control = response.headers.get('Cache-Control') or ''
+        match = re.search(r'max-age=(\d+)', cache_control)
+        ttl = int(match.group(1)) if match else self.default_ttl
+        keys = {}
+        for key in jwks['keys']:
+            if 'kid' in key:
+                keys[key['kid']] = {
+                    'kty': key['kty'],
+                    'kid': key['kid'],
+                    'use': key.get('use', 'sig'),
+                    'n': key['n'],
+                    'e': key['e']
+                }
+        return keys, max(ttl, self.min_refetch_interval)
+
+    def refresh(self):
+        '''
+        refetches the key set; callers arriving while a fetch is running
+        wait for that fetch instead of starting their own, and get a
+        JWKSError if it leaves them without keys
+        '''
+        with self._lock:
+            fetching = self._fetching
+            if fetching is None:
+                fetching = self._fetching = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            fetching.wait(self.timeout)
+            if not self._keys:
+                raise JWKSError('the signing keys are unavailable')
+            return
+        self._attempted_at = time.monotonic()
+        try:
+            keys, ttl = self.fetch()
+            self._keys, self._ttl = keys, ttl
+            self._fetched_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._fetching = None
+            fetching.set()
+
+    def refresh_in_background(self):
+        if self._fetching is not None:
+            return
+        threading.Thread(target=self._refresh_quietly, daemon=True).start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # the current keys stay in use and the next lookup retries
+            pass
+
+    def may_fetch(self):
+        return self._attempted_at is None or \
+            time.monotonic() - self._attempted_at > self.min_refetch_interval
+
+    def wait_for_fetch(self):
+        '''
+        waits for the fetch another caller started, if one is running
+        '''
+        fetching = self._fetching
+        if fetching is not None:
+            fetching.wait(self.timeout)
+
+    def get_key(self, kid):
+        '''
+        returns the key with the given kid, or None when the issuer does
+        not have it; raises JWKSError when no keys could be fetched
+        '''
+        age = None if self._fetched_at is None else time.monotonic() - self._fetched_at
+        if age is None or age > self._ttl:
+            # while the issuer is unreachable, expired keys are served rather
+            # than failing every request, and the fetch is retried a bit later
+            if self.may_fetch():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    if not self._keys:
+                        raise JWKSError('unable to fetch the signing keys from {}'.format(self.source)) from e
+            else:
+                # the last fetch may have started moments ago and still be running
+                self.wait_for_fetch()
+                if not self._keys:
+                    raise JWKSError('the signing keys are unavailable')
+        elif age > self._ttl * self.refresh_ahead:
+            self.refresh_in_background()
+        key = self._keys.get(kid)
+        if key is None:
+            if self.may_fetch():
+                try:
+                    self.refresh()
+                except Exception:
+                    return None
+            else:
+                self.wait_for_fetch()
+            key = self._keys.get(kid)
+        return key
@@ -0,0 +1,144 @@
+import argparse
+import base64
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+'''
+LocalIssuer
+    an offline stand-in for the Auth0 tenant: an RS256 key generated at
+    start-up, its JWKS served over HTTP from a thread of the current
+    process, and issue() to sign access tokens with it. Point the API at
+    it with
+
+        AUTH0_DOMAIN=<issuer.domain> API_AUDIENCE=<issuer.audience>
+        JWKS_URL=<issuer.jwks_url>
+
+    set before the auth module is imported, and requires_auth protected
+    endpoints can be exercised and load tested without network access.
+    Running this file starts an issuer, prints those variables and a token
+    and keeps serving the keys:
+
+        python -m auth_kit.local_issuer --permissions get:drinks-detail
+
+    from the root of the repository (BasicFlaskAuth's API expects
+    --audience image).
+'''
+class LocalIssuer(object):
+    def __init__(self, domain='local-issuer.test', audience='dev', host='127.0.0.1', port=0, bits=2048):
+        self.domain = domain
+        self.audience = audience
+        self.kid = uuid.uuid4().hex
+        self.key = RSA.generate(bits)
+        self._private_pem = self.key.exportKey('PEM').decode('ascii')
+        self.jwks = json.dumps({'keys': [{
+            'kty': 'RSA',
+            'kid': self.kid,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': _b64(self.key.n),
+            'e': _b64(self.key.e)
+        }]}).encode('utf-8')
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    def _handler(self):
+        issuer = self
+
+        class JWKSHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/.well-known/jwks.json':
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', 'public, max-age=3600')
+                self.send_header('Content-Length', str(len(issuer.jwks)))
+                self.end_headers()
+                self.wfile.write(issuer.jwks)
+
+            def log_message(self, format, *args):
+                pass
+
+        return JWKSHandler
+
+    @property
+    def jwks_url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/.well-known/jwks.json'.format(host, port)
+
+    @property
+    def environ(self):
+        '''
+        the variables that point the auth module at this issuer
+        '''
+        return {
+            'AUTH0_DOMAIN': self.domain,
+            'API_AUDIENCE': self.audience,
+            'JWKS_URL': self.jwks_url
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def issue(self, permissions=(), subject='local|user', expires_in=3600, **claims):
+        '''
+        returns a signed access token with the given permissions
+        '''
+        now = int(time.time())
+        payload = {
+            'iss': 'https://{}/'.format(self.domain),
+            'aud': self.audience,
+            'sub': subject,
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions)
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self._private_pem, algorithm='RS256', headers={'kid': self.kid})
+
+
+def _b64(number):
+    data = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local JWKS and issue tokens signed with it.')
+    parser.add_argument('--domain', default='local-issuer.test')
+    parser.add_argument('--audience', default='dev')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--permissions', nargs='*', default=[])
+    parser.add_argument('--expires-in', type=int, default=86400)
+    args = parser.parse_args()
+
+    issuer = LocalIssuer(args.domain, args.audience, port=args.port).start()
+    for name, value in issuer.environ.items():
+        print('export {}={}'.format(name, value))
+    print('export TOKEN={}'.format(issuer.issue(args.permissions, expires_in=args.expires_in)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        issuer.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import fnmatch
+import re
+
+from .token_cache import verified_token
+
+'''
+AuthError
+    a standardized way to communicate auth failure modes: `error` is a
+    {'code', 'description'} dict and `status_code` the HTTP status the
+    request should be answered with
+'''
+class AuthError(Exception):
+    def __init__(self, error, status_code):
+        self.error = error
+        self.status_code = status_code
+
+
+'''
+compile_permissions(permissions)
+    @INPUTS
+        permissions: permission strings (i.e. 'post:drinks'), which may use
+            shell-style wildcards (i.e. 'get:*')
+
+    returns a function that takes a token's permissions as a frozenset (see
+    token_cache.VerifiedToken) and raises an AuthError unless every
+    permission is granted; a wildcard is granted when any of the token's
+    permissions matches it. Plain permissions are checked with one subset
+    test and the wildcards are compiled once, when the route is decorated.
+'''
+def compile_permissions(permissions):
+    wildcards = [p for p in permissions if any(c in p for c in '*?[')]
+    required = frozenset(p for p in permissions if p and p not in wildcards)
+    patterns = [re.compile(fnmatch.translate(p)) for p in wildcards]
+
+    def check(granted):
+        if granted is None:
+            raise AuthError({
+                'code': 'invalid_claims',
+                'description': 'Permissions not included in JWT.'
+            }, 400)
+
+        if not required <= granted or not all(
+                any(pattern.match(permission) for permission in granted) for pattern in patterns):
+            raise AuthError({
+                'code': 'unauthorized',
+                'description': 'Permission not found.'
+            }, 403)
+        return True
+
+    return check
+
+
+'''
+check_permissions(permission, payload)
+    @INPUTS
+        permission: string permission (i.e. 'post:drink')
+        payload: decoded jwt payload
+
+    raises an AuthError if permissions are not included in the payload or
+    the requested permission is not among them, returns True otherwise;
+    routes decorated with requires_auth use compile_permissions directly
+'''
+def check_permissions(permission, payload):
+    return compile_permissions([permission])(verified_token(payload).permissions)
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+'''
+VerifiedToken
+    payload: the decoded claims
+    permissions: the 'permissions' claim as a frozenset, built once when
+        the token is verified so permission checks are set lookups; None
+        when the token has no permissions claim
+'''
+VerifiedToken = namedtuple('VerifiedToken', ['payload', 'permissions'])
+
+def verified_token(payload):
+    permissions = payload.get('permissions')
+    return VerifiedToken(payload, None if permissions is None else frozenset(permissions))
+
+'''
+TokenCache
+    VerifiedTokens of bearer tokens that passed verification, so a client
+    sending the same token again skips the RS256 signature check and the
+    claim validation. Entries are keyed by a SHA-256 digest of the token
+    (the token itself is never kept), expire at the token's `exp` claim and
+    the least recently used entry is dropped once `max_entries` is reached.
+
+    A cached token stays accepted until it expires even if the issuer
+    rotates the key that signed it, the same as with stateless
+    verification.
+'''
+class TokenCache(object):
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        '''
+        returns the VerifiedToken of a verified, unexpired token or None
+        '''
+        key = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, token, verified):
+        # tokens without an expiry are verified every time
+        if self.max_entries <= 0 or 'exp' not in verified.payload:
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (verified.payload['exp'], verified)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+'''
+verify_token(token_cache, token, decode)
+    the VerifiedToken of a bearer token: the cached one when the token was
+    verified before, otherwise that of decode(token), which checks the
+    token and returns its payload (raising when it is invalid), stored in
+    token_cache for the next request
+'''
+def verify_token(token_cache, token, decode):
+    verified = token_cache.get(token)
+    if verified is None:
+        verified = verified_token(decode(token))
+        token_cache.put(token, verified)
+    return verified
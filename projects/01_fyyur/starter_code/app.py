@@ -16,6 +16,10 @@ from flask_wtf import Form
 from forms import *
 import sys
 from models import db, Venue, Artist, Show
+from routing import read_only
+from partitions import shows_cli, archived_shows
+from fragment_cache import init_fragment_cache
+from assets import init_assets
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -29,6 +33,10 @@ db.init_app(app)
 
 # TODO: connect to a local postgresql database - DONE
 migrate = Migrate(app, db)
+# `flask shows maintain` creates future show partitions and archives old ones
+app.cli.add_command(shows_cli)
+# hashed, pre-compressed static bundles (`flask assets build`) and the asset_urls() template helper
+init_assets(app)
 
 #----------------------------------------------------------------------------#
 # Filters.
@@ -44,6 +52,8 @@ def format_datetime(value, format='medium'):
 
 # registering filters in Jinja2: https://flask.palletsprojects.com/en/1.1.x/templating/#registering-filters
 app.jinja_env.filters['datetime'] = format_datetime
+# {% cache key, ttl %} fragment caching for show tiles and venue/artist headers
+init_fragment_cache(app)
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -58,6 +68,7 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
 def venues():
   # TODO: replace with real venues data. - DONE
   #       num_shows should be aggregated based on number of upcoming shows per venue. - DONE
@@ -96,6 +107,7 @@ def venues():
   return render_template('pages/venues.html', areas=data)
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. - DONE
   # seach for Hop should return "The Musical Hop".
@@ -122,6 +134,7 @@ def search_venues():
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@read_only
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id - DONE
@@ -132,7 +145,8 @@ def show_venue(venue_id):
     Artist.id,
     Artist.name,
     Artist.image_link,
-    Show.start_time).\
+    Show.start_time,
+    Artist.updated_at).\
     join(Artist).\
       filter(Show.venue_id==venue_id).\
         filter(Show.start_time<datetime.now()).\
@@ -145,6 +159,7 @@ def show_venue(venue_id):
       "artist_id": show[0],
       "artist_name": show[1],
       "artist_image_link": show[2],
+      "artist_updated_at": show[4],
       "start_time": format_datetime(str(show[3]))
     })
   
@@ -153,7 +168,8 @@ def show_venue(venue_id):
     Artist.id,
     Artist.name,
     Artist.image_link,
-    Show.start_time).\
+    Show.start_time,
+    Artist.updated_at).\
     join(Artist).\
       filter(Show.venue_id==venue_id).\
         filter(Show.start_time>datetime.now()).\
@@ -165,6 +181,7 @@ def show_venue(venue_id):
       "artist_id": show[0],
       "artist_name": show[1],
       "artist_image_link": show[2],
+      "artist_updated_at": show[4],
       "start_time": format_datetime(str(show[3]))
     })
 
@@ -182,6 +199,7 @@ def show_venue(venue_id):
     "seeking_talent": venue.seeking_talent,
     "seeking_description": venue.seeking_description,
     "image_link": venue.image_link,
+    "updated_at": venue.updated_at,
     "upcoming_shows": upcoming_show_data,
     "past_shows": past_show_data,
     "past_shows_count": len(past_show_data),
@@ -273,6 +291,7 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_only
 def artists():
   # TODO: replace with real data returned from querying the database - DONE
   artists = Artist.query.all()
@@ -285,6 +304,7 @@ def artists():
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. - DONE
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band". - DONE
@@ -316,6 +336,7 @@ def search_artists():
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@read_only
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # TODO: replace with real artist data from the artist table, using artist_id - DONE
@@ -326,12 +347,35 @@ def show_artist(artist_id):
     Venue.id,
     Venue.name,
     Venue.image_link,
-    Show.start_time).\
+    Show.start_time,
+    Venue.updated_at).\
     join(Venue).\
       filter(Show.artist_id==artist_id).\
         filter(Show.start_time<datetime.now()).\
           order_by(Show.start_time).\
             all()
+
+  # Archived Shows ----------------------------------------- #
+  # shows from partitions archived by `flask shows maintain` are only read on request
+  # (/artists/<id>?include_archived=1); they are all older than the ones still in the db
+  if request.args.get('include_archived'):
+    archived = list(archived_shows(app.config['SHOW_ARCHIVE_DIR'], artist_id=artist_id))
+    archived_venues = {}
+    if archived:
+      archived_venues = {venue.id: venue for venue in db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.image_link,
+        Venue.updated_at).\
+        filter(Venue.id.in_({show[1] for show in archived})).\
+          all()}
+    archived_shows_data = [
+      (venue_id, archived_venues[venue_id].name, archived_venues[venue_id].image_link, start_time,
+        archived_venues[venue_id].updated_at)
+      for _, venue_id, _, start_time in archived
+      if venue_id in archived_venues
+    ]
+    past_shows = sorted(archived_shows_data, key=lambda show: show[3]) + past_shows
   
   past_show_data = []
   for show in past_shows:
@@ -339,6 +383,7 @@ def show_artist(artist_id):
       "venue_id": show[0],
       "venue_name": show[1],
       "venue_image_link": show[2],
+      "venue_updated_at": show[4],
       "start_time": format_datetime(str(show[3]))
     })
 
@@ -347,7 +392,8 @@ def show_artist(artist_id):
     Venue.id,
     Venue.name,
     Venue.image_link,
-    Show.start_time).\
+    Show.start_time,
+    Venue.updated_at).\
     join(Venue).\
       filter(Show.artist_id==artist_id).\
         filter(Show.start_time>datetime.now()).\
@@ -359,6 +405,7 @@ def show_artist(artist_id):
       "venue_id": show[0],
       "venue_name": show[1],
       "venue_image_link": show[2],
+      "venue_updated_at": show[4],
       "start_time": format_datetime(str(show[3]))
     })
 
@@ -376,6 +423,7 @@ def show_artist(artist_id):
     "seeking_venue": artist.seeking_venue,
     "seeking_description": artist.seeking_description,
     "image_link": artist.image_link,
+    "updated_at": artist.updated_at,
     "past_shows": past_show_data,
     "upcoming_shows": upcoming_show_data,
     "past_shows_count": len(past_show_data),
@@ -530,6 +578,7 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data. - DONE
@@ -547,6 +596,8 @@ def shows():
         "artist_id": show.artist_id,
         "artist_name": show.artist.name,
         "artist_image_link": show.artist.image_link,
+        "artist_updated_at": show.artist.updated_at,
+        "venue_updated_at": show.venue.updated_at,
         "start_time": format_datetime(str(show.start_time))
       })
     else:
@@ -0,0 +1,343 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import asyncio
+from datetime import datetime
+from quart import Quart, render_template, request, abort, url_for
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from app import app as wsgi_app, format_datetime
+from assets import DIST_DIR, asset_urls_for
+from fragment_cache import init_fragment_cache
+from models import Venue, Artist, Show
+from partitions import archived_shows
+
+#----------------------------------------------------------------------------#
+# App Config.
+#----------------------------------------------------------------------------#
+
+# Optional ASGI deployment mode. The read-only views are served by a Quart app
+# backed by an AsyncSession on asyncpg, so independent queries (e.g. the venue,
+# past shows and upcoming shows on show_venue) run concurrently instead of one
+# after the other. Everything else falls through to the regular Flask app.
+# Run with: hypercorn -w 4 asgi:application
+app = Quart(__name__)
+app.config.from_object('config')
+app.config['SECRET_KEY'] = wsgi_app.config['SECRET_KEY']
+app.jinja_env.filters['datetime'] = format_datetime
+init_fragment_cache(app)
+# the layout's bundle URLs, from the manifest the Flask app loaded; the
+# bundles themselves are served by the Flask app's dist route (see below)
+app.jinja_env.globals['asset_urls'] = asset_urls_for(wsgi_app, url_for)
+
+engine = create_async_engine(
+  app.config['SQLALCHEMY_ASYNC_DATABASE_URI'],
+  pool_size=app.config.get('SQLALCHEMY_ASYNC_POOL_SIZE', 10)
+)
+# expire_on_commit is off because rows are read after the session is closed
+async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# an AsyncSession can only run one statement at a time, so every query that
+# should run concurrently with another gets its own session (and connection)
+async def fetch_all(statement):
+  async with async_session() as session:
+    result = await session.execute(statement)
+    return result.all()
+
+async def fetch_one(statement):
+  async with async_session() as session:
+    result = await session.execute(statement)
+    return result.first()
+
+def venue_shows(venue_id, upcoming):
+  now = datetime.now()
+  when = Show.start_time > now if upcoming else Show.start_time < now
+  return select(
+    Artist.id,
+    Artist.name,
+    Artist.image_link,
+    Show.start_time,
+    Artist.updated_at).\
+    join(Artist).\
+      filter(Show.venue_id==venue_id).\
+        filter(when).\
+          order_by(Show.start_time)
+
+def artist_shows(artist_id, upcoming):
+  now = datetime.now()
+  when = Show.start_time > now if upcoming else Show.start_time < now
+  return select(
+    Venue.id,
+    Venue.name,
+    Venue.image_link,
+    Show.start_time,
+    Venue.updated_at).\
+    join(Venue).\
+      filter(Show.artist_id==artist_id).\
+        filter(when).\
+          order_by(Show.start_time)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+@app.route('/')
+async def index():
+  return await render_template('pages/home.html')
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@app.route('/venues')
+async def venues():
+  # one grouped query replaces the per-area and per-venue queries of the sync view
+  rows = await fetch_all(
+    select(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      func.count(Show.id)).\
+      outerjoin(Show, and_(Show.venue_id==Venue.id, Show.start_time>datetime.now())).\
+        group_by(Venue.id).\
+          order_by(Venue.state, Venue.city, Venue.name)
+  )
+  data = []
+  areas = {}
+  for venue_id, name, city, state, num_upcoming_shows in rows:
+    if (city, state) not in areas:
+      areas[(city, state)] = []
+      data.append({
+        'city': city,
+        'state': state,
+        'venues': areas[(city, state)]
+      })
+    areas[(city, state)].append({
+      'id': venue_id,
+      'name': name,
+      'num_upcoming_shows': num_upcoming_shows
+    })
+  return await render_template('pages/venues.html', areas=data)
+
+@app.route('/venues/search', methods=['POST'])
+async def search_venues():
+  form = await request.form
+  search = "%{}%".format(form['search_term'])
+  search_venue = await fetch_all(
+    select(Venue.id, Venue.name).filter(Venue.name.ilike(search))
+  )
+  response = {
+    "count": len(search_venue),
+    "data": [{"id": venue.id, "name": venue.name} for venue in search_venue]
+  }
+  return await render_template('pages/search_venues.html', results=response, search_term=form.get('search_term', ''))
+
+@app.route('/venues/<int:venue_id>')
+async def show_venue(venue_id):
+  # the three queries are independent, so they are awaited together
+  venue, past_shows, upcoming_shows = await asyncio.gather(
+    fetch_one(select(Venue).filter(Venue.id==venue_id)),
+    fetch_all(venue_shows(venue_id, upcoming=False)),
+    fetch_all(venue_shows(venue_id, upcoming=True))
+  )
+  if venue is None:
+    abort(404)
+  venue = venue[0]
+
+  past_show_data = [{
+    "artist_id": show[0],
+    "artist_name": show[1],
+    "artist_image_link": show[2],
+    "artist_updated_at": show[4],
+    "start_time": format_datetime(str(show[3]))
+  } for show in past_shows]
+  upcoming_show_data = [{
+    "artist_id": show[0],
+    "artist_name": show[1],
+    "artist_image_link": show[2],
+    "artist_updated_at": show[4],
+    "start_time": format_datetime(str(show[3]))
+  } for show in upcoming_shows]
+
+  data = {
+    "id": venue_id,
+    "name": venue.name,
+    "address": venue.address,
+    "genres": venue.genres,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website_link,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "updated_at": venue.updated_at,
+    "upcoming_shows": upcoming_show_data,
+    "past_shows": past_show_data,
+    "past_shows_count": len(past_show_data),
+    "upcoming_shows_count": len(upcoming_show_data)
+  }
+  return await render_template('pages/show_venue.html', venue=data)
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@app.route('/artists')
+async def artists():
+  rows = await fetch_all(select(Artist.id, Artist.name))
+  data = [{'id': artist.id, 'name': artist.name} for artist in rows]
+  return await render_template('pages/artists.html', artists=data)
+
+@app.route('/artists/search', methods=['POST'])
+async def search_artists():
+  form = await request.form
+  search = "%{}%".format(form['search_term'])
+  search_artist = await fetch_all(
+    select(Artist.id, Artist.name).filter(Artist.name.ilike(search))
+  )
+  response = {
+    "count": len(search_artist),
+    "data": [{"id": artist.id, "name": artist.name} for artist in search_artist]
+  }
+  return await render_template('pages/search_artists.html', results=response, search_term=form.get('search_term', ''))
+
+@app.route('/artists/<int:artist_id>')
+async def show_artist(artist_id):
+  artist, past_shows, upcoming_shows = await asyncio.gather(
+    fetch_one(select(Artist).filter(Artist.id==artist_id)),
+    fetch_all(artist_shows(artist_id, upcoming=False)),
+    fetch_all(artist_shows(artist_id, upcoming=True))
+  )
+  if artist is None:
+    abort(404)
+  artist = artist[0]
+
+  # shows from archived partitions, only on request, as in app.show_artist;
+  # the archive files are read in a worker thread to keep the loop free
+  if request.args.get('include_archived'):
+    archived = await asyncio.get_running_loop().run_in_executor(
+      None, lambda: list(archived_shows(app.config['SHOW_ARCHIVE_DIR'], artist_id=artist_id)))
+    archived_venues = {}
+    if archived:
+      archived_venues = {venue.id: venue for venue in await fetch_all(
+        select(
+          Venue.id,
+          Venue.name,
+          Venue.image_link,
+          Venue.updated_at).\
+          filter(Venue.id.in_({show[1] for show in archived}))
+      )}
+    archived_shows_data = [
+      (venue_id, archived_venues[venue_id].name, archived_venues[venue_id].image_link, start_time,
+        archived_venues[venue_id].updated_at)
+      for _, venue_id, _, start_time in archived
+      if venue_id in archived_venues
+    ]
+    past_shows = sorted(archived_shows_data, key=lambda show: show[3]) + list(past_shows)
+
+  past_show_data = [{
+    "venue_id": show[0],
+    "venue_name": show[1],
+    "venue_image_link": show[2],
+    "venue_updated_at": show[4],
+    "start_time": format_datetime(str(show[3]))
+  } for show in past_shows]
+  upcoming_show_data = [{
+    "venue_id": show[0],
+    "venue_name": show[1],
+    "venue_image_link": show[2],
+    "venue_updated_at": show[4],
+    "start_time": format_datetime(str(show[3]))
+  } for show in upcoming_shows]
+
+  data = {
+    "id": artist_id,
+    "name": artist.name,
+    "genres": artist.genres,
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website_link,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "updated_at": artist.updated_at,
+    "past_shows": past_show_data,
+    "upcoming_shows": upcoming_show_data,
+    "past_shows_count": len(past_show_data),
+    "upcoming_shows_count": len(upcoming_show_data)
+  }
+  return await render_template('pages/show_artist.html', artist=data)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@app.route('/shows')
+async def shows():
+  # only upcoming shows are selected, joined to their venue and artist in the same query
+  rows = await fetch_all(
+    select(
+      Show.venue_id,
+      Venue.name,
+      Show.artist_id,
+      Artist.name,
+      Artist.image_link,
+      Show.start_time,
+      Venue.updated_at,
+      Artist.updated_at).\
+      join(Venue, Show.venue_id==Venue.id).\
+        join(Artist, Show.artist_id==Artist.id).\
+          filter(Show.start_time>datetime.now())
+  )
+  data = [{
+    "venue_id": show[0],
+    "venue_name": show[1],
+    "artist_id": show[2],
+    "artist_name": show[3],
+    "artist_image_link": show[4],
+    "venue_updated_at": show[6],
+    "artist_updated_at": show[7],
+    "start_time": format_datetime(str(show[5]))
+  } for show in rows]
+  return await render_template('pages/shows.html', shows=data)
+
+@app.errorhandler(404)
+async def not_found_error(error):
+  return await render_template('errors/404.html'), 404
+
+@app.errorhandler(500)
+async def server_error(error):
+  return await render_template('errors/500.html'), 500
+
+#----------------------------------------------------------------------------#
+# Dispatch.
+#----------------------------------------------------------------------------#
+
+wsgi_fallback = WsgiToAsgi(wsgi_app)
+# the hashed bundles and their pre-compressed siblings (assets.send_asset)
+dist_prefix = wsgi_app.static_url_path + '/' + DIST_DIR + '/'
+
+async def application(scope, receive, send):
+  # requests matching one of the async read views go to Quart, everything else
+  # (forms, submissions, deletes, static files) is handed to the Flask app
+  if scope['type'] == 'http':
+    if scope['path'].startswith(dist_prefix):
+      return await wsgi_fallback(scope, receive, send)
+    adapter = app.url_map.bind('')
+    try:
+      endpoint, _ = adapter.match(scope['path'], method=scope['method'])
+    except (NotFound, MethodNotAllowed):
+      endpoint = None
+    if endpoint is None or endpoint == 'static':
+      return await wsgi_fallback(scope, receive, send)
+  return await app(scope, receive, send)
@@ -0,0 +1,225 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+from werkzeug.exceptions import NotFound
+
+# both are optional: without brotli no .br files are written, without rjsmin
+# the JavaScript bundles are concatenated but not minified
+try:
+  import brotli
+except ImportError:
+  brotli = None
+try:
+  import rjsmin
+except ImportError:
+  rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# Each bundle is built into static/dist/<name>.<hash>.<ext> together with
+# .gz/.br siblings, and static/dist/manifest.json maps the bundle name to the
+# hashed file. dist/ sits next to css/ so relative url(../fonts/...) references
+# keep working. Until `flask assets build` has been run the templates fall back
+# to the individual source files.
+BUNDLES = {
+  'app.css': [
+    'css/bootstrap.min.css',
+    'css/layout.main.css',
+    'css/main.css',
+    'css/main.responsive.css',
+    'css/main.quickfix.css',
+  ],
+  'head.js': [
+    'js/libs/modernizr-2.8.2.min.js',
+    'js/libs/moment.min.js',
+  ],
+  # loaded with defer at the end of the body, after jQuery
+  'app.js': [
+    'js/script.js',
+    'js/libs/bootstrap-3.1.1.min.js',
+    'js/plugins.js',
+  ],
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# a year; the file name changes whenever the content does
+IMMUTABLE_MAX_AGE = 31536000
+
+#----------------------------------------------------------------------------#
+# Minification.
+#----------------------------------------------------------------------------#
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+
+def _minify_css_code(code):
+  code = re.sub(r'\s+', ' ', code)
+  code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+  code = re.sub(r':\s+', ':', code)
+  return code.replace(';}', '}')
+
+def minify_css(source):
+  # strings are copied untouched and comments dropped, only the code between
+  # them has its whitespace collapsed
+  parts = []
+  position = 0
+  for match in CSS_TOKENS.finditer(source):
+    parts.append(_minify_css_code(source[position:match.start()]))
+    if match.group(1):
+      parts.append(match.group(1))
+    position = match.end()
+  parts.append(_minify_css_code(source[position:]))
+  return ''.join(parts).strip()
+
+def minify_js(source):
+  if rjsmin is None:
+    return source
+  return rjsmin.jsmin(source)
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+def build_bundle(static_dir, name, sources):
+  contents = []
+  for source in sources:
+    with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+      contents.append(f.read())
+  stem, ext = os.path.splitext(name)
+  if ext == '.css':
+    content = '\n'.join(minify_css(css) for css in contents)
+  else:
+    # the separator keeps one file's last statement from running into the next
+    content = ';\n'.join(minify_js(js) for js in contents)
+  data = content.encode('utf-8')
+  digest = hashlib.sha256(data).hexdigest()[:12]
+  filename = '{}.{}{}'.format(stem, digest, ext)
+  path = os.path.join(static_dir, DIST_DIR, filename)
+  with open(path, 'wb') as f:
+    f.write(data)
+  # mtime=0 keeps the .gz byte-identical between builds of the same content
+  with open(path + '.gz', 'wb') as f:
+    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as compressed:
+      compressed.write(data)
+  if brotli is not None:
+    with open(path + '.br', 'wb') as f:
+      f.write(brotli.compress(data, quality=11))
+  return filename, len(data)
+
+def build(static_dir):
+  dist_dir = os.path.join(static_dir, DIST_DIR)
+  os.makedirs(dist_dir, exist_ok=True)
+  manifest = {}
+  sizes = {}
+  for name, sources in BUNDLES.items():
+    filename, size = build_bundle(static_dir, name, sources)
+    manifest[name] = DIST_DIR + '/' + filename
+    sizes[name] = size
+  # files from previous builds are no longer referenced by the manifest
+  current = set(os.path.basename(path) for path in manifest.values())
+  for filename in os.listdir(dist_dir):
+    bundle = re.sub(r'\.(gz|br)$', '', filename)
+    if filename != MANIFEST and bundle not in current:
+      os.remove(os.path.join(dist_dir, filename))
+  with open(os.path.join(dist_dir, MANIFEST), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  return manifest, sizes
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+def load_manifest(static_dir):
+  try:
+    with open(os.path.join(static_dir, DIST_DIR, MANIFEST)) as f:
+      return json.load(f)
+  except (IOError, ValueError):
+    return {}
+
+def asset_urls_for(app, url_for):
+  # the asset_urls() template global: the hashed bundle when it has been
+  # built, otherwise the individual files. `app` holds the manifest and
+  # url_for is the framework's own, so asgi.py can use it under Quart too
+  def asset_urls(name):
+    manifest = app.extensions['assets']
+    if name in manifest:
+      return [url_for('static', filename=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+  return asset_urls
+
+# served in this order of preference when the client accepts several equally
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def accepted_quality(accept, encoding):
+  # the q value an Accept-Encoding header (werkzeug's request.accept_encodings)
+  # gives `encoding`; an entry for the encoding itself takes precedence over
+  # '*', so 'gzip;q=0, *' still refuses gzip
+  wildcard = 0
+  for value, quality in accept:
+    if value.lower() == encoding:
+      return quality
+    if value == '*':
+      wildcard = quality
+  return wildcard
+
+def send_asset(filename):
+  # serves the pre-compressed sibling with the highest q value the client
+  # accepts, or the file itself when it accepts none of them
+  dist_dir = os.path.join(current_app.static_folder, DIST_DIR)
+  mimetype = mimetypes.guess_type(filename)[0]
+  best_quality = 0
+  best = None
+  for encoding, suffix in ENCODINGS:
+    quality = accepted_quality(request.accept_encodings, encoding)
+    if quality > best_quality and os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+      best_quality = quality
+      best = encoding, suffix
+  if best is not None:
+    encoding, suffix = best
+    response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetype, cache_timeout=IMMUTABLE_MAX_AGE)
+    response.headers['Content-Encoding'] = encoding
+  else:
+    if not os.path.isfile(os.path.join(dist_dir, filename)):
+      raise NotFound()
+    response = send_from_directory(dist_dir, filename, mimetype=mimetype, cache_timeout=IMMUTABLE_MAX_AGE)
+  response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(IMMUTABLE_MAX_AGE)
+  response.headers['Vary'] = 'Accept-Encoding'
+  return response
+
+def init_assets(app):
+  app.extensions['assets'] = load_manifest(app.static_folder)
+  app.jinja_env.globals['asset_urls'] = asset_urls_for(app, url_for)
+  # more specific than /static/<path:filename>, so it takes precedence
+  app.add_url_rule(
+    app.static_url_path + '/' + DIST_DIR + '/<path:filename>',
+    endpoint='dist_asset',
+    view_func=send_asset
+  )
+  app.cli.add_command(assets_cli)
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+assets_cli = AppGroup('assets', help='Build the static asset bundles.')
+
+@assets_cli.command('build')
+def build_command():
+  manifest, sizes = build(current_app.static_folder)
+  for name in sorted(manifest):
+    compressed = ['.gz'] + (['.br'] if brotli is not None else [])
+    click.echo('{:<10} -> {} ({} bytes, {})'.format(name, manifest[name], sizes[name], ' '.join(compressed)))
+  # pick up the new manifest without restarting when run in-process
+  current_app.extensions['assets'] = manifest
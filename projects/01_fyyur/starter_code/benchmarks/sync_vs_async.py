@@ -0,0 +1,77 @@
+'''
+Compares requests/sec of the read-only views between the sync WSGI app and
+the optional ASGI app (asgi.py). Start both with the same number of workers
+before running, e.g.
+
+  gunicorn -w 4 -b 127.0.0.1:8000 app:app
+  hypercorn -w 4 -b 127.0.0.1:8001 asgi:application
+  python benchmarks/sync_vs_async.py --venue 1 --artist 1
+
+Only the standard library is used so the client is not the bottleneck of
+either server's dependencies.
+'''
+import argparse
+import threading
+import time
+from urllib.request import urlopen
+from urllib.error import URLError
+
+
+def hammer(base_url, paths, concurrency, duration):
+  counts = [0] * concurrency
+  errors = [0] * concurrency
+  deadline = time.monotonic() + duration
+
+  def worker(n):
+    i = n
+    while time.monotonic() < deadline:
+      path = paths[i % len(paths)]
+      i += 1
+      try:
+        with urlopen(base_url + path) as response:
+          response.read()
+        counts[n] += 1
+      except URLError:
+        errors[n] += 1
+
+  threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+  start = time.monotonic()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.monotonic() - start
+  return sum(counts) / elapsed, sum(errors)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--sync-url', default='http://127.0.0.1:8000')
+  parser.add_argument('--async-url', default='http://127.0.0.1:8001')
+  parser.add_argument('--venue', type=int, default=1, help='venue id used for /venues/<id>')
+  parser.add_argument('--artist', type=int, default=1, help='artist id used for /artists/<id>')
+  parser.add_argument('--concurrency', type=int, default=32)
+  parser.add_argument('--duration', type=float, default=15.0)
+  args = parser.parse_args()
+
+  paths = [
+    '/venues',
+    '/artists',
+    '/shows',
+    '/venues/{}'.format(args.venue),
+    '/artists/{}'.format(args.artist),
+  ]
+  for path in paths:
+    print('{:<20}'.format(path), end='')
+    for label, url in (('sync', args.sync_url), ('async', args.async_url)):
+      rps, errors = hammer(url, [path], args.concurrency, args.duration)
+      print('  {}: {:8.1f} req/s ({} errors)'.format(label, rps, errors), end='')
+    print()
+
+  for label, url in (('sync', args.sync_url), ('async', args.async_url)):
+    rps, errors = hammer(url, paths, args.concurrency, args.duration)
+    print('mixed {:<5} {:8.1f} req/s ({} errors)'.format(label, rps, errors))
+
+
+if __name__ == '__main__':
+  main()
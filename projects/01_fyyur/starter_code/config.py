@@ -13,4 +13,27 @@ DEBUG = True
 SQLALCHEMY_DATABASE_URI = 'postgresql://leogovan@localhost:5432/fyyur'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 # This config will echo out executed SQL statements to the terminal
-# SQLALCHEMY_ECHO = True
\ No newline at end of file
+# SQLALCHEMY_ECHO = True
+# Used by the optional ASGI mode (asgi.py), same database through the asyncpg driver
+SQLALCHEMY_ASYNC_DATABASE_URI = 'postgresql+asyncpg://leogovan@localhost:5432/fyyur'
+SQLALCHEMY_ASYNC_POOL_SIZE = 10
+# Read-only views are spread round-robin over these replicas, e.g.
+# ['postgresql://leogovan@replica1:5432/fyyur']. Empty means everything uses the primary.
+SQLALCHEMY_REPLICA_URIS = []
+# Seconds between health checks of a replica
+REPLICA_HEALTH_CHECK_INTERVAL = 10
+# After a write, the same client reads from the primary for this many seconds
+REPLICA_STICKY_SECONDS = 5
+
+# Show partitions (`flask shows maintain`)
+# Months of future partitions to keep created
+SHOW_PARTITIONS_AHEAD = 3
+# Partitions older than this many months are archived and dropped
+SHOW_RETENTION_MONTHS = 24
+SHOW_ARCHIVE_DIR = os.path.join(basedir, 'archive')
+
+# Template fragment cache ({% cache key, ttl %})
+# Maximum number of cached fragments
+FRAGMENT_CACHE_SIZE = 1000
+# Default seconds a fragment is kept when the tag gives no ttl
+FRAGMENT_CACHE_TTL = 300
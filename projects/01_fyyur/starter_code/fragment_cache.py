@@ -0,0 +1,74 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.utils import LRUCache
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+# Adds a {% cache key, ttl %}...{% endcache %} tag to Jinja. The rendered body
+# is kept in a bounded LRU for ttl seconds (FRAGMENT_CACHE_TTL when omitted).
+# Keys should change whenever the fragment's data does, e.g.
+#
+#   {% cache (venue.id, venue.updated_at), 600 %} ... {% endcache %}
+#
+# The template name and line are added to the key, so the same entity can be
+# cached in different fragments without clashing.
+
+class FragmentCacheExtension(Extension):
+  tags = {'cache'}
+
+  def __init__(self, environment):
+    super(FragmentCacheExtension, self).__init__(environment)
+    environment.extend(
+      fragment_cache=LRUCache(1000),
+      fragment_cache_ttl=300
+    )
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    key = parser.parse_expression()
+    if parser.stream.skip_if('comma'):
+      ttl = parser.parse_expression()
+    else:
+      ttl = nodes.Const(None)
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    args = [nodes.Const('{}:{}'.format(parser.name, lineno)), key, ttl]
+    # with enable_async (the Quart app) caller() returns a coroutine, which
+    # has to be awaited before its output can be cached
+    method = '_render_async' if self.environment.is_async else '_render'
+    return nodes.CallBlock(self.call_method(method, args), [], [], body).set_lineno(lineno)
+
+  def _lookup(self, location, key):
+    cached = self.environment.fragment_cache.get((location, key))
+    if cached is not None and cached[0] > time.monotonic():
+      return cached[1]
+    return None
+
+  def _store(self, location, key, ttl, value):
+    if ttl is None:
+      ttl = self.environment.fragment_cache_ttl
+    self.environment.fragment_cache[(location, key)] = (time.monotonic() + ttl, value)
+    return value
+
+  def _render(self, location, key, ttl, caller):
+    cached = self._lookup(location, key)
+    if cached is not None:
+      return cached
+    return self._store(location, key, ttl, caller())
+
+  async def _render_async(self, location, key, ttl, caller):
+    cached = self._lookup(location, key)
+    if cached is not None:
+      return cached
+    return self._store(location, key, ttl, await caller())
+
+def init_fragment_cache(app):
+  app.jinja_env.add_extension(FragmentCacheExtension)
+  app.jinja_env.fragment_cache = LRUCache(app.config.get('FRAGMENT_CACHE_SIZE', 1000))
+  app.jinja_env.fragment_cache_ttl = app.config.get('FRAGMENT_CACHE_TTL', 300)
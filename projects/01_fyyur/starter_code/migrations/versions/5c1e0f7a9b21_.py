@@ -0,0 +1,90 @@
+"""partition show by month on start_time
+
+Revision ID: 5c1e0f7a9b21
+Revises: e1191c9812dc
+Create Date: 2021-06-14 10:12:41.508113
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e0f7a9b21'
+down_revision = 'e1191c9812dc'
+branch_labels = None
+depends_on = None
+
+# months of empty partitions created ahead of the latest show
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.execute('ALTER TABLE show RENAME TO show_unpartitioned')
+    op.execute('ALTER INDEX show_pkey RENAME TO show_unpartitioned_pkey')
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY NONE')
+
+    # the partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE show (
+            id integer NOT NULL DEFAULT nextval('show_id_seq'),
+            venue_id integer NOT NULL REFERENCES venue (id),
+            artist_id integer NOT NULL REFERENCES artist (id),
+            start_time timestamp without time zone NOT NULL,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    """)
+    op.execute('CREATE TABLE show_default PARTITION OF show DEFAULT')
+    op.execute('CREATE INDEX ix_show_venue_id_start_time ON show (venue_id, start_time)')
+    op.execute('CREATE INDEX ix_show_artist_id_start_time ON show (artist_id, start_time)')
+
+    today = date.today().replace(day=1)
+    first, last = bind.execute(sa.text(
+        'SELECT min(start_time), max(start_time) FROM show_unpartitioned'
+    )).first()
+    month = date(first.year, first.month, 1) if first else today
+    last = max(date(last.year, last.month, 1) if last else today, today)
+    while month <= add_months(last, MONTHS_AHEAD):
+        op.execute(
+            "CREATE TABLE show_{:04d}_{:02d} PARTITION OF show "
+            "FOR VALUES FROM ('{}') TO ('{}')".format(
+                month.year, month.month, month.isoformat(), add_months(month, 1).isoformat())
+        )
+        month = add_months(month, 1)
+
+    op.execute(
+        'INSERT INTO show (id, venue_id, artist_id, start_time) '
+        'SELECT id, venue_id, artist_id, start_time FROM show_unpartitioned'
+    )
+    op.execute('DROP TABLE show_unpartitioned')
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY show.id')
+
+
+def downgrade():
+    # shows in partitions that were already archived by `flask shows maintain`
+    # are not restored; reload them from the archive files if needed
+    op.execute('ALTER TABLE show RENAME TO show_partitioned')
+    op.execute('ALTER INDEX show_pkey RENAME TO show_partitioned_pkey')
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY NONE')
+    op.execute("""
+        CREATE TABLE show (
+            id integer NOT NULL DEFAULT nextval('show_id_seq'),
+            venue_id integer NOT NULL REFERENCES venue (id),
+            artist_id integer NOT NULL REFERENCES artist (id),
+            start_time timestamp without time zone NOT NULL,
+            CONSTRAINT show_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(
+        'INSERT INTO show (id, venue_id, artist_id, start_time) '
+        'SELECT id, venue_id, artist_id, start_time FROM show_partitioned'
+    )
+    op.execute('DROP TABLE show_partitioned CASCADE')
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY show.id')
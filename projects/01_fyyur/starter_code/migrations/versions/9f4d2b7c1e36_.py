@@ -0,0 +1,26 @@
+"""add updated_at to venue and artist
+
+Revision ID: 9f4d2b7c1e36
+Revises: 5c1e0f7a9b21
+Create Date: 2021-06-21 16:40:08.271935
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4d2b7c1e36'
+down_revision = '5c1e0f7a9b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('artist', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('venue', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade():
+    op.drop_column('venue', 'updated_at')
+    op.drop_column('artist', 'updated_at')
@@ -1,6 +1,8 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from routing import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+# routes reads from @read_only views to the replicas in SQLALCHEMY_REPLICA_URIS
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -21,6 +23,8 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # part of the template fragment cache keys, see fragment_cache.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.func.now())
     shows = db.relationship('Show', backref='venue', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
@@ -42,6 +46,8 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # part of the template fragment cache keys, see fragment_cache.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.func.now())
     shows = db.relationship('Show', backref='artist', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
@@ -52,12 +58,15 @@ class Artist(db.Model):
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 class Show(db.Model):
+    # partitioned by month on start_time, see partitions.py; the partition
+    # key has to be part of the primary key, so it is (id, start_time) and
+    # id is still drawn from show_id_seq
     __tablename__ = 'show'
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, primary_key=True)
 
     def __repr__(self):
         return f'<Show {self.id}>'
\ No newline at end of file
@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import glob
+import gzip
+import os
+import re
+from datetime import datetime, date
+import click
+import dateutil.parser
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import text
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# `show` is range-partitioned by month on start_time (see migration
+# 5c1e0f7a9b21). Each month lives in a table named show_YYYY_MM, and
+# show_default catches anything no monthly partition covers yet. Months older
+# than the retention window are detached and written to
+# SHOW_ARCHIVE_DIR/show_YYYY_MM.csv.gz before the table is dropped.
+
+PARTITION_NAME = re.compile(r'^show_(\d{4})_(\d{2})$')
+ARCHIVE_COLUMNS = ('id', 'venue_id', 'artist_id', 'start_time')
+
+def month_start(value):
+  return date(value.year, value.month, 1)
+
+def add_months(month, count):
+  index = month.year * 12 + month.month - 1 + count
+  return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+  return 'show_{:04d}_{:02d}'.format(month.year, month.month)
+
+def partition_month(name):
+  match = PARTITION_NAME.match(name)
+  if match is None:
+    return None
+  return date(int(match.group(1)), int(match.group(2)), 1)
+
+def list_partitions(connection):
+  rows = connection.execute(text(
+    "SELECT c.relname FROM pg_inherits i "
+    "JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'show'::regclass"
+  ))
+  months = [partition_month(row[0]) for row in rows]
+  return sorted(month for month in months if month is not None)
+
+def create_partition(connection, month):
+  # rows for this month that already landed in show_default are moved into
+  # the new table before it is attached, otherwise ATTACH PARTITION fails
+  name = partition_name(month)
+  bounds = {'start': month, 'end': add_months(month, 1)}
+  connection.execute(text(
+    'CREATE TABLE {} (LIKE show INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name)
+  ))
+  connection.execute(text(
+    'INSERT INTO {} SELECT * FROM show_default '
+    'WHERE start_time >= :start AND start_time < :end'.format(name)
+  ), bounds)
+  connection.execute(text(
+    'DELETE FROM show_default WHERE start_time >= :start AND start_time < :end'
+  ), bounds)
+  connection.execute(text(
+    "ALTER TABLE show ATTACH PARTITION {} FOR VALUES FROM ('{}') TO ('{}')".format(
+      name, bounds['start'].isoformat(), bounds['end'].isoformat())
+  ))
+
+def archive_partition(connection, month, archive_dir):
+  # the archive is left at <path>.tmp: it only becomes visible to
+  # archived_shows() through publish_archives(), once the transaction that
+  # drops the partition has committed, so no show is ever in both places
+  name = partition_name(month)
+  path = os.path.join(archive_dir, name + '.csv.gz')
+  connection.execute(text('ALTER TABLE show DETACH PARTITION {}'.format(name)))
+  # COPY goes through the raw psycopg2 cursor so the rows are streamed to the
+  # file instead of being loaded into memory
+  cursor = connection.connection.cursor()
+  with gzip.open(path + '.tmp', 'wt', newline='') as archive:
+    cursor.copy_expert(
+      'COPY (SELECT {} FROM {} ORDER BY start_time) TO STDOUT WITH CSV'.format(
+        ', '.join(ARCHIVE_COLUMNS), name),
+      archive
+    )
+  connection.execute(text('DROP TABLE {}'.format(name)))
+  return path
+
+def maintain_partitions(connection, ahead, retention, archive_dir, today=None):
+  this_month = month_start(today or datetime.now())
+  existing = set(list_partitions(connection))
+  created = []
+  for offset in range(ahead + 1):
+    month = add_months(this_month, offset)
+    if month not in existing:
+      create_partition(connection, month)
+      created.append(month)
+  archived = []
+  cutoff = add_months(this_month, -retention)
+  for month in sorted(existing):
+    if month < cutoff:
+      archived.append(archive_partition(connection, month, archive_dir))
+  return created, archived
+
+def publish_archives(paths):
+  for path in paths:
+    os.replace(path + '.tmp', path)
+
+def discard_archives(archive_dir):
+  for path in glob.glob(os.path.join(archive_dir, 'show_*.csv.gz.tmp')):
+    os.remove(path)
+
+#----------------------------------------------------------------------------#
+# Archived shows.
+#----------------------------------------------------------------------------#
+
+def archived_shows(archive_dir, artist_id=None, venue_id=None):
+  # yields (id, venue_id, artist_id, start_time) rows from every archive file
+  for path in sorted(glob.glob(os.path.join(archive_dir, 'show_*.csv.gz'))):
+    with gzip.open(path, 'rt', newline='') as archive:
+      for row in csv.reader(archive):
+        show_id, show_venue_id, show_artist_id = int(row[0]), int(row[1]), int(row[2])
+        if artist_id is not None and show_artist_id != artist_id:
+          continue
+        if venue_id is not None and show_venue_id != venue_id:
+          continue
+        yield show_id, show_venue_id, show_artist_id, dateutil.parser.parse(row[3])
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+shows_cli = AppGroup('shows', help='Maintain the partitioned show table.')
+
+@shows_cli.command('maintain')
+@click.option('--ahead', type=int, default=None, help='Months of future partitions to keep created.')
+@click.option('--retention', type=int, default=None, help='Months of past partitions to keep in the database.')
+@click.option('--archive-dir', default=None, help='Where detached partitions are written.')
+@with_appcontext
+def maintain_command(ahead, retention, archive_dir):
+  from models import db
+  config = current_app.config
+  ahead = config['SHOW_PARTITIONS_AHEAD'] if ahead is None else ahead
+  retention = config['SHOW_RETENTION_MONTHS'] if retention is None else retention
+  archive_dir = archive_dir or config['SHOW_ARCHIVE_DIR']
+  os.makedirs(archive_dir, exist_ok=True)
+  try:
+    with db.engine.begin() as connection:
+      created, archived = maintain_partitions(connection, ahead, retention, archive_dir)
+  except Exception:
+    # the partitions are still in the database
+    discard_archives(archive_dir)
+    raise
+  publish_archives(archived)
+  for month in created:
+    click.echo('created {}'.format(partition_name(month)))
+  for path in archived:
+    click.echo('archived {}'.format(path))
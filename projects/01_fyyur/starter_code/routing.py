@@ -0,0 +1,160 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import itertools
+import os
+import threading
+import time
+from functools import wraps
+from flask import g, request, has_request_context, current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm, text
+from sqlalchemy.exc import SQLAlchemyError
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# Reads from views decorated with @read_only go to one of the replicas listed
+# in SQLALCHEMY_REPLICA_URIS (round-robin, skipping replicas that fail their
+# health check). Everything else, and any read from a client that committed a
+# write less than REPLICA_STICKY_SECONDS ago, goes to SQLALCHEMY_DATABASE_URI.
+
+STICKY_COOKIE = 'fyyur_primary_until'
+
+class Replica(object):
+  def __init__(self, uri, connect_timeout):
+    self.uri = uri
+    self.engine = create_engine(
+      uri,
+      pool_pre_ping=True,
+      connect_args={'connect_timeout': connect_timeout}
+    )
+    # only written by the pool's checker thread, requests just read it;
+    # until the first check has passed, reads stay on the primary
+    self.healthy = False
+    self.checked_at = 0.0
+
+  def check(self):
+    try:
+      with self.engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+      self.healthy = True
+    except SQLAlchemyError:
+      self.healthy = False
+    self.checked_at = time.monotonic()
+    return self.healthy
+
+class ReplicaPool(object):
+  def __init__(self, uris, check_interval=10, connect_timeout=2):
+    self.replicas = [Replica(uri, connect_timeout) for uri in uris]
+    self.check_interval = check_interval
+    self._counter = itertools.count()
+    self._lock = threading.Lock()
+    self._stopped = threading.Event()
+    self._checker = None
+    self._checker_pid = None
+
+  def check_all(self):
+    for replica in self.replicas:
+      replica.check()
+
+  def _run_checks(self):
+    while not self._stopped.is_set():
+      self.check_all()
+      self._stopped.wait(self.check_interval)
+
+  def _ensure_checker(self):
+    # the checker is started by the first request of each process rather than
+    # in init_app, so workers forked after the app was created get their own
+    if self._checker_pid == os.getpid():
+      return
+    with self._lock:
+      if self._checker_pid != os.getpid():
+        self._checker = threading.Thread(target=self._run_checks, name='replica-health-check', daemon=True)
+        self._checker.start()
+        self._checker_pid = os.getpid()
+
+  def choose(self):
+    # round-robin over the replicas the checker last found healthy, returning
+    # None when there are none; this never connects, a replica that is down
+    # only costs the checker thread its connect_timeout
+    self._ensure_checker()
+    for _ in range(len(self.replicas)):
+      with self._lock:
+        replica = self.replicas[next(self._counter) % len(self.replicas)]
+      if replica.healthy:
+        return replica.engine
+    return None
+
+  def dispose(self):
+    self._stopped.set()
+    if self._checker is not None and self._checker_pid == os.getpid():
+      self._checker.join()
+    for replica in self.replicas:
+      replica.engine.dispose()
+
+#----------------------------------------------------------------------------#
+# Session.
+#----------------------------------------------------------------------------#
+
+def wants_replica():
+  if not has_request_context() or not g.get('db_read_only', False):
+    return False
+  # read-your-writes: stay on the primary right after this client wrote
+  try:
+    primary_until = float(request.cookies.get(STICKY_COOKIE, 0))
+  except ValueError:
+    primary_until = 0
+  return primary_until < time.time()
+
+class RoutingSession(SignallingSession):
+  def get_bind(self, mapper=None, clause=None):
+    if not self._flushing and wants_replica():
+      pool = self.app.extensions.get('replicas')
+      engine = pool.choose() if pool else None
+      if engine is not None:
+        return engine
+    return super(RoutingSession, self).get_bind(mapper, clause)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_write(session):
+  if has_request_context():
+    g.db_committed = True
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def init_app(self, app):
+    super(RoutingSQLAlchemy, self).init_app(app)
+    app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+    app.config.setdefault('REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    app.config.setdefault('REPLICA_CONNECT_TIMEOUT', 2)
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+    if app.config['SQLALCHEMY_REPLICA_URIS']:
+      app.extensions['replicas'] = ReplicaPool(
+        app.config['SQLALCHEMY_REPLICA_URIS'],
+        check_interval=app.config['REPLICA_HEALTH_CHECK_INTERVAL'],
+        connect_timeout=app.config['REPLICA_CONNECT_TIMEOUT']
+      )
+    app.after_request(set_sticky_cookie)
+
+def set_sticky_cookie(response):
+  if g.get('db_committed', False):
+    sticky = current_app.config['REPLICA_STICKY_SECONDS']
+    response.set_cookie(STICKY_COOKIE, str(time.time() + sticky), max_age=sticky, httponly=True)
+  return response
+
+#----------------------------------------------------------------------------#
+# Decorators.
+#----------------------------------------------------------------------------#
+
+def read_only(f):
+  # marks a view whose queries may be served by a read replica
+  @wraps(f)
+  def wrapper(*args, **kwargs):
+    g.db_read_only = True
+    return f(*args, **kwargs)
+  return wrapper
@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from flask_migrate import upgrade
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+
+from app import app
+from models import db, Venue, Artist, Show
+from partitions import create_partition, list_partitions
+from routing import ReplicaPool
+
+database_path = os.environ.get('FYYUR_TEST_DATABASE', 'postgresql://localhost:5432/fyyur_test')
+
+archive_dir = None
+
+def setUpModule():
+  # builds the schema from the migrations, so show is partitioned as in production
+  global archive_dir
+  # the schema is dropped, so never run against anything but a test database
+  if not (make_url(database_path).database or '').endswith('_test'):
+    raise RuntimeError('FYYUR_TEST_DATABASE must name a database ending in _test, not {}'.format(database_path))
+  engine = create_engine(database_path)
+  with engine.begin() as setup:
+    setup.exec_driver_sql('DROP SCHEMA public CASCADE')
+    setup.exec_driver_sql('CREATE SCHEMA public')
+  engine.dispose()
+
+  archive_dir = tempfile.mkdtemp()
+  app.config.update(
+    SQLALCHEMY_DATABASE_URI=database_path,
+    SHOW_ARCHIVE_DIR=archive_dir,
+    SHOW_PARTITIONS_AHEAD=0,
+    SHOW_RETENTION_MONTHS=24,
+    TESTING=True
+  )
+  with app.app_context():
+    upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+
+def tearDownModule():
+  with app.app_context():
+    db.session.remove()
+    db.engine.dispose()
+  shutil.rmtree(archive_dir)
+
+class ShowPartitionTestCase(unittest.TestCase):
+  """Shows in the partitioned table and in the archive of `flask shows maintain`"""
+
+  def setUp(self):
+    with app.app_context():
+      db.session.execute('TRUNCATE show, venue, artist RESTART IDENTITY CASCADE')
+      db.session.commit()
+    for name in os.listdir(archive_dir):
+      os.remove(os.path.join(archive_dir, name))
+    self.client = app.test_client()
+
+  def add_artist_and_venue(self):
+    with app.app_context():
+      artist = Artist(name='The Wild Sax Band', city='San Francisco', state='CA', phone='326-123-5000', genres='Jazz')
+      venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+                    phone='123-123-1234', genres=['Jazz'])
+      db.session.add_all([artist, venue])
+      db.session.commit()
+      return artist.id, venue.id
+
+  def add_shows(self, artist_id, venue_id, *start_times):
+    with app.app_context():
+      shows = [Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time) for start_time in start_times]
+      db.session.add_all(shows)
+      db.session.commit()
+      return [show.id for show in shows]
+
+  def maintain(self):
+    result = app.test_cli_runner().invoke(args=['shows', 'maintain'])
+    self.assertEqual(result.exit_code, 0, result.output)
+    return result.output
+
+  def test_show_ids_come_from_the_sequence(self):
+    artist_id, venue_id = self.add_artist_and_venue()
+    start_time = datetime(2030, 5, 1, 20)
+
+    ids = self.add_shows(artist_id, venue_id, start_time, start_time)
+
+    self.assertEqual(ids, [1, 2])
+    with app.app_context():
+      self.assertEqual(Show.query.get((1, start_time)).artist_id, artist_id)
+
+  def test_include_archived_lists_archived_shows(self):
+    artist_id, venue_id = self.add_artist_and_venue()
+    with app.app_context(), db.engine.begin() as connection:
+      for month in (datetime(2019, 1, 1), datetime(2019, 2, 1)):
+        create_partition(connection, month.date())
+    recent = datetime.now() - timedelta(days=1)
+    self.add_shows(artist_id, venue_id, datetime(2019, 1, 5, 21), datetime(2019, 2, 9, 20), recent)
+
+    output = self.maintain()
+
+    self.assertIn('show_2019_01.csv.gz', output)
+    self.assertIn('show_2019_02.csv.gz', output)
+    with app.app_context():
+      self.assertNotIn(datetime(2019, 1, 1).date(), list_partitions(db.session.connection()))
+      self.assertEqual(Show.query.count(), 1)
+
+    res = self.client.get('/artists/{}'.format(artist_id))
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'1 Past Show<', res.data)
+    self.assertNotIn(b'2019', res.data)
+
+    res = self.client.get('/artists/{}?include_archived=1'.format(artist_id))
+    self.assertEqual(res.status_code, 200)
+    self.assertIn(b'3 Past Shows', res.data)
+    self.assertEqual(res.data.count(b'The Musical Hop'), 3)
+    self.assertIn(b'2019', res.data)
+
+class ReplicaPoolTestCase(unittest.TestCase):
+  """Replica selection of routing.py"""
+
+  def test_choose_round_robins_over_healthy_replicas(self):
+    pool = ReplicaPool([database_path, database_path])
+    self.addCleanup(pool.dispose)
+    pool.check_all()
+
+    engines = [pool.choose() for _ in range(4)]
+
+    self.assertEqual(engines, [pool.replicas[0].engine, pool.replicas[1].engine] * 2)
+
+  def test_choose_does_not_wait_for_a_health_check(self):
+    pool = ReplicaPool([database_path])
+    self.addCleanup(pool.dispose)
+    # a replica that does not answer, so every check takes connect_timeout
+    pool.replicas[0].check = lambda: time.sleep(1)
+
+    start = time.monotonic()
+    engine = pool.choose()
+    elapsed = time.monotonic() - start
+
+    self.assertIsNone(engine)
+    self.assertLess(elapsed, 0.5)
+
+class AssetTestCase(unittest.TestCase):
+  """Pre-compressed bundles served by assets.send_asset"""
+
+  def setUp(self):
+    static_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, static_dir)
+    os.mkdir(os.path.join(static_dir, 'dist'))
+    for suffix in ('', '.gz', '.br'):
+      with open(os.path.join(static_dir, 'dist', 'app.0123456789ab.css' + suffix), 'w') as f:
+        f.write(suffix)
+    self.addCleanup(setattr, app, 'static_folder', app.static_folder)
+    app.static_folder = static_dir
+    self.client = app.test_client()
+
+  def encoding(self, accept_encoding):
+    res = self.client.get('/static/dist/app.0123456789ab.css', headers={'Accept-Encoding': accept_encoding})
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+    res.close()
+    return res.headers.get('Content-Encoding')
+
+  def test_preferred_encoding(self):
+    self.assertEqual(self.encoding('gzip, deflate, br'), 'br')
+    self.assertEqual(self.encoding('gzip'), 'gzip')
+    self.assertEqual(self.encoding('*'), 'br')
+
+  def test_quality_values(self):
+    self.assertEqual(self.encoding('br;q=0.5, gzip'), 'gzip')
+    self.assertEqual(self.encoding('br;q=0, *'), 'gzip')
+    self.assertIsNone(self.encoding('gzip;q=0'))
+    self.assertIsNone(self.encoding('br;q=0, gzip;q=0, *'))
+
+  def test_encodings_are_matched_whole(self):
+    self.assertIsNone(self.encoding('x-gzip-ish, brotli'))
+    self.assertIsNone(self.encoding(''))
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,82 @@
+'''
+Compares the full-text search behind POST /questions with the
+ILIKE '%term%' scan it replaces. Point it at a scratch database; --seed
+adds that many synthetic questions first (then run models.setup_db once,
+e.g. by starting the app, so the tsvector columns and indexes exist).
+
+  python -m benchmarks.question_search --database postgres://localhost:5432/trivia_bench --seed 500000
+'''
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine, text
+
+from models import database_path
+
+WORDS = ('title', 'river', 'capital', 'painter', 'novel', 'planet', 'element', 'empire',
+         'goal', 'album', 'mountain', 'ocean', 'theory', 'battle', 'language', 'island')
+TERMS = ('title', 'river capital', 'painter novel', 'planet')
+REPEAT = 20
+PER_PAGE = 10
+
+ILIKE_COUNT = "SELECT count(*) FROM questions WHERE question ILIKE :pattern"
+ILIKE_PAGE = "SELECT id, question FROM questions WHERE question ILIKE :pattern ORDER BY id LIMIT :limit"
+FTS_COUNT = ("SELECT count(*) FROM questions, websearch_to_tsquery('english', :term) query "
+             "WHERE question_tsv @@ query")
+FTS_PAGE = ("SELECT id, question, ts_rank(question_tsv, query) AS rank "
+            "FROM questions, websearch_to_tsquery('english', :term) query "
+            "WHERE question_tsv @@ query ORDER BY rank DESC, id LIMIT :limit")
+
+
+def seed(connection, count):
+  batch = []
+  for _ in range(count):
+    words = random.sample(WORDS, 6)
+    batch.append({
+      'question': 'Which {} of the {} is known for its {} {} {}?'.format(*words[:5]),
+      'answer': words[5],
+      'category': str(random.randint(1, 6)),
+      'difficulty': random.randint(1, 5)
+    })
+    if len(batch) == 10000:
+      connection.execute(text(
+        'INSERT INTO questions (question, answer, category, difficulty) '
+        'VALUES (:question, :answer, :category, :difficulty)'), batch)
+      batch = []
+  if batch:
+    connection.execute(text(
+      'INSERT INTO questions (question, answer, category, difficulty) '
+      'VALUES (:question, :answer, :category, :difficulty)'), batch)
+  connection.execute(text('ANALYZE questions'))
+
+
+def timed(connection, statements, params):
+  start = time.perf_counter()
+  for _ in range(REPEAT):
+    for statement in statements:
+      connection.execute(text(statement), params).fetchall()
+  return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--database', default=database_path)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  engine = create_engine(args.database)
+  with engine.begin() as connection:
+    if args.seed:
+      seed(connection, args.seed)
+  with engine.connect() as connection:
+    rows = connection.execute(text('SELECT count(*) FROM questions')).scalar()
+    print('{} questions, {} runs per term (count + first page)'.format(rows, REPEAT))
+    for term in TERMS:
+      ilike = timed(connection, (ILIKE_COUNT, ILIKE_PAGE), {'pattern': '%{}%'.format(term), 'limit': PER_PAGE})
+      fts = timed(connection, (FTS_COUNT, FTS_PAGE), {'term': term, 'limit': PER_PAGE})
+      print('{:<16} ilike {:8.2f} ms   full-text {:8.2f} ms'.format(term, ilike, fts))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,55 @@
+'''
+Benchmarks QuizSampler against the load-all-then-random.choice approach
+with an in-memory bank of 1M questions over 6 categories. No database is
+needed; run from the backend folder with
+
+  python -m benchmarks.quiz_sampler
+'''
+import random
+import time
+
+from flaskr.quiz import QuizSampler
+
+QUESTIONS = 1000000
+CATEGORIES = 6
+REQUESTS = 2000
+QUIZ_LENGTH = 20
+
+
+def naive_pick(rows, category, previous):
+  # what the endpoint would do with Question.query.all() already in memory
+  candidates = [question_id for question_id, question_category in rows
+                if question_category == category and question_id not in previous]
+  return random.choice(candidates) if candidates else None
+
+
+def main():
+  rows = [(question_id, str(question_id % CATEGORIES + 1)) for question_id in range(1, QUESTIONS + 1)]
+
+  sampler = QuizSampler(db=None)
+  start = time.perf_counter()
+  sampler.load(rows)
+  print('load {} ids: {:.2f}s'.format(QUESTIONS, time.perf_counter() - start))
+
+  quizzes = []
+  for _ in range(REQUESTS):
+    category = str(random.randint(1, CATEGORIES))
+    previous = random.sample(range(1, QUESTIONS + 1), random.randint(0, QUIZ_LENGTH))
+    quizzes.append((category, previous))
+
+  start = time.perf_counter()
+  for category, previous in quizzes:
+    sampler.sample(category, previous)
+  elapsed = time.perf_counter() - start
+  print('sampler: {:10.1f} picks/s ({:.1f} us/pick)'.format(REQUESTS / elapsed, elapsed / REQUESTS * 1e6))
+
+  naive_requests = 20
+  start = time.perf_counter()
+  for category, previous in quizzes[:naive_requests]:
+    naive_pick(rows, category, set(previous))
+  elapsed = time.perf_counter() - start
+  print('naive:   {:10.1f} picks/s ({:.1f} us/pick)'.format(naive_requests / elapsed, elapsed / naive_requests * 1e6))
+
+
+if __name__ == '__main__':
+  main()
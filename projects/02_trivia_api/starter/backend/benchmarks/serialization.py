@@ -0,0 +1,75 @@
+'''
+Compares the list endpoint serialization path (column tuples,
+format_questions() and orjson, see flaskr/serialize.py) with loading
+Question instances and calling format() + json.dumps. Runs against an
+in-memory SQLite database, so no PostgreSQL is needed; run from the
+backend folder with
+
+  python -m benchmarks.serialization
+'''
+import json
+import time
+import tracemalloc
+
+from flask import Flask
+
+from models import db, Question, Category
+from flaskr import serialize
+
+QUESTIONS = 50000
+PAGE_SIZE = 100
+PAGES = 200
+
+
+def orm_page(offset):
+  questions = Question.query.order_by(Question.id).offset(offset).limit(PAGE_SIZE).all()
+  return json.dumps({'questions': [question.format() for question in questions]}).encode('utf-8')
+
+
+def tuple_page(offset):
+  rows = serialize.question_rows().order_by(Question.id).offset(offset).limit(PAGE_SIZE).all()
+  return serialize.dumps({'questions': serialize.format_questions(rows)})
+
+
+def measure(name, render):
+  offsets = [(page * PAGE_SIZE) % QUESTIONS for page in range(PAGES)]
+  start = time.perf_counter()
+  for offset in offsets:
+    render(offset)
+    # a request ends with a fresh session, so nothing stays in the identity map
+    db.session.remove()
+  elapsed = time.perf_counter() - start
+
+  tracemalloc.start()
+  render(0)
+  allocated, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  db.session.remove()
+  print('{:<28} {:10.0f} objects/s   peak {:7.1f} KiB per page'.format(
+    name, PAGES * PAGE_SIZE / elapsed, peak / 1024))
+
+
+def main():
+  app = Flask(__name__)
+  app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+  db.init_app(app)
+  with app.app_context():
+    db.create_all()
+    db.session.add_all([Category(type) for type in ('Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports')])
+    db.session.bulk_insert_mappings(Question, [{
+      'question': 'Question number {} of the benchmark bank?'.format(i),
+      'answer': 'Answer {}'.format(i),
+      'category': i % 6 + 1,
+      'difficulty': i % 5 + 1
+    } for i in range(QUESTIONS)])
+    db.session.commit()
+    db.session.remove()
+
+    print('{} questions, {} pages of {}'.format(QUESTIONS, PAGES, PAGE_SIZE))
+    measure('ORM + format() + json', orm_page)
+    measure('tuples + {}'.format('orjson' if serialize.orjson else 'json'), tuple_page)
+
+
+if __name__ == '__main__':
+  main()
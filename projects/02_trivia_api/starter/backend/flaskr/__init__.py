@@ -4,42 +4,98 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import random
 
-from models import setup_db, Question, Category
+from models import setup_db, database_path, db, Question, Category
+from .bulk import trivia_cli
+from .categories import CategoryCache, QuestionCounts
+from .search import search_questions
+from .stats import question_stats
+from .serialize import question_rows, format_questions, json_response
+from .pagination import keyset_page, offset_page, ApproximateCounter
+from .quiz import QuizSampler
+from .quiz_sessions import MemoryQuizSessionStore
 
 QUESTIONS_PER_PAGE = 10
+# questions in a quiz session unless the client asks for another length
+QUESTIONS_PER_QUIZ = 5
+MAX_QUESTIONS_PER_QUIZ = 100
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
-  setup_db(app)
-  
-  '''
-  @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
-  '''
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+  setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
+  CORS(app, resources={r"/*": {"origins": "*"}})
+  # flask trivia import/export, see bulk.py
+  app.cli.add_command(trivia_cli)
 
-  '''
-  @TODO: Use the after_request decorator to set Access-Control-Allow
-  '''
+  # notified of this app's writes, see models.notify
+  listeners = app.extensions['trivia_listeners']
+
+  # total_questions comes from the planner's row estimate, see pagination.py
+  question_counter = ApproximateCounter(db)
+  # in-memory question ids per category for /quizzes, see quiz.py
+  quiz_sampler = QuizSampler(db, background=not app.testing)
+  listeners['question'].append(quiz_sampler.on_question_change)
+  quiz_sessions = app.config.get('QUIZ_SESSION_STORE') or MemoryQuizSessionStore()
+  # categories rarely change, so they are served from memory, see categories.py
+  category_cache = CategoryCache()
+  listeners['category'].append(category_cache.on_category_change)
+  question_counts = QuestionCounts()
+  listeners['question'].append(question_counts.on_question_change)
+
+  @app.after_request
+  def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PATCH,DELETE,OPTIONS')
+    return response
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests 
-  for all available categories.
+  GET /categories
+      returns {'categories': {id: type}}. Responses carry a strong ETag and
+      Cache-Control: no-cache, so browsers revalidate with If-None-Match and
+      get a 304 without the server touching the database.
   '''
+  @app.route('/categories')
+  def get_categories():
+    categories, etag = category_cache.get()
+    response = json_response({
+      'success': True,
+      'categories': categories
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests for questions, 
-  including pagination (every 10 questions). 
-  This endpoint should return a list of questions, 
-  number of total questions, current category, categories. 
-
-  TEST: At this point, when you start the application
-  you should see questions and categories generated,
-  ten questions per page and pagination at the bottom of the screen for three pages.
-  Clicking on the page numbers should update the questions. 
+  GET /questions
+      pages through the questions, QUESTIONS_PER_PAGE at a time.
+      ?after=<id> returns the page following question <id> by keyset
+      (WHERE id > after LIMIT n), which costs the same on every page;
+      ?page=<n> is kept for the page numbers in the frontend.
+      next_after is the value of ?after= for the following page.
   '''
+  @app.route('/questions')
+  def get_questions():
+    after = request.args.get('after', None, type=int)
+    page = request.args.get('page', 1, type=int)
+    if after is not None:
+      result = keyset_page(question_rows(), Question.id, after, QUESTIONS_PER_PAGE)
+    else:
+      result = offset_page(question_rows(), Question.id, page, QUESTIONS_PER_PAGE)
+    if not result.items and (after is not None or page > 1):
+      abort(404)
+
+    categories, _ = category_cache.get()
+    return json_response({
+      'success': True,
+      'questions': format_questions(result.items),
+      'total_questions': question_counter.count(Question),
+      'categories': categories,
+      'current_category': None,
+      'next_after': result.next_after
+    })
 
   '''
   @TODO: 
@@ -61,43 +117,179 @@ def create_app(test_config=None):
   '''
 
   '''
-  @TODO: 
-  Create a POST endpoint to get questions based on a search term. 
-  It should return any questions for whom the search term 
-  is a substring of the question. 
+  POST /questions with {'searchTerm': term}
+      ranked full-text search of the questions, see search.py. Optional
+      body keys: 'page' (1-based, QUESTIONS_PER_PAGE per page) and
+      'include_answers' to match the answer text as well. Each question
+      has a 'highlight' snippet with the matched words in <mark>.
+  '''
+  @app.route('/questions', methods=['POST'])
+  def search():
+    body = request.get_json()
+    if body is None or 'searchTerm' not in body:
+      abort(400)
+    term = body['searchTerm']
+    if term is not None and not isinstance(term, str):
+      abort(422)
+    try:
+      page = int(body.get('page', 1))
+    except (TypeError, ValueError):
+      abort(422)
+    if page < 1:
+      abort(422)
 
-  TEST: Search by any phrase. The questions list will update to include 
-  only question that include that string within their question. 
-  Try using the word "title" to start. 
+    questions, total = search_questions(
+      term or '',
+      include_answers=bool(body.get('include_answers', False)),
+      page=page,
+      per_page=QUESTIONS_PER_PAGE
+    )
+    return json_response({
+      'success': True,
+      'questions': questions,
+      'total_questions': total,
+      'current_category': None
+    })
+
+  '''
+  GET /categories/<category_id>/questions
+      pages through the questions of one category like GET /questions
+      (?after=<id> or ?page=<n>), using the index on questions.category.
+      'question_counts' holds the number of questions of every category,
+      see categories.QuestionCounts; 'total_questions' is the one of this
+      category.
   '''
+  @app.route('/categories/<int:category_id>/questions')
+  def get_category_questions(category_id):
+    categories, _ = category_cache.get()
+    if category_id not in categories:
+      abort(404)
+    after = request.args.get('after', None, type=int)
+    page = request.args.get('page', 1, type=int)
+    query = question_rows().filter(Question.category == category_id)
+    if after is not None:
+      result = keyset_page(query, Question.id, after, QUESTIONS_PER_PAGE)
+    else:
+      result = offset_page(query, Question.id, page, QUESTIONS_PER_PAGE)
+    if not result.items and (after is not None or page > 1):
+      abort(404)
+
+    counts = question_counts.get()
+    return json_response({
+      'success': True,
+      'questions': format_questions(result.items),
+      'total_questions': counts.get(category_id, 0),
+      'question_counts': counts,
+      'current_category': categories[category_id],
+      'next_after': result.next_after
+    })
+
 
   '''
-  @TODO: 
-  Create a GET endpoint to get questions based on category. 
+  POST /quizzes
+      with {'quiz_category': {'id', 'type'}, 'length': n} starts a quiz
+      session of n (default QUESTIONS_PER_QUIZ) questions of the category
+      (all categories when the id is 0) and returns its 'quiz_id'; the
+      questions are then fetched one by one from /quizzes/<quiz_id>/next.
 
-  TEST: In the "List" tab / main screen, clicking on one of the 
-  categories in the left column will cause only questions of that 
-  category to be shown. 
+      Bodies that include 'previous_questions' get the original protocol:
+      a random question of the category that is not one of the previous
+      questions, or 'question': None once they have all been asked.
   '''
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    body = request.get_json()
+    if body is None:
+      abort(400)
+    try:
+      previous_questions = [int(question_id) for question_id in body.get('previous_questions', [])]
+      category_id = int((body.get('quiz_category') or {}).get('id', 0))
+      length = int(body.get('length', QUESTIONS_PER_QUIZ))
+    except (TypeError, ValueError):
+      abort(422)
+    if not 0 < length <= MAX_QUESTIONS_PER_QUIZ:
+      abort(422)
 
+    if 'previous_questions' not in body:
+      question_ids = quiz_sampler.sample_many(category_id or None, length)
+      return jsonify({
+        'success': True,
+        'quiz_id': quiz_sessions.create(question_ids),
+        'total_questions': len(question_ids)
+      })
 
-  '''
-  @TODO: 
-  Create a POST endpoint to get questions to play the quiz. 
-  This endpoint should take category and previous question parameters 
-  and return a random questions within the given category, 
-  if provided, and that is not one of the previous questions. 
+    question = quiz_sampler.next_question(category_id or None, previous_questions)
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None
+    })
 
-  TEST: In the "Play" tab, after a user selects "All" or a category,
-  one question at a time is displayed, the user is allowed to answer
-  and shown whether they were correct or not. 
   '''
+  POST /quizzes/<quiz_id>/next
+      returns the next question of a quiz session started with POST
+      /quizzes, or 'question': None when the quiz is over
+  '''
+  @app.route('/quizzes/<quiz_id>/next', methods=['POST'])
+  def next_quiz_question(quiz_id):
+    while True:
+      try:
+        question_id = quiz_sessions.next(quiz_id)
+      except KeyError:
+        abort(404)
+      question = None if question_id is None else Question.query.get(question_id)
+      # questions deleted since the quiz started are skipped
+      if question is not None or question_id is None:
+        break
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None
+    })
 
   '''
-  @TODO: 
-  Create error handlers for all expected errors 
-  including 404 and 422. 
+  GET /stats
+      question counts for the dashboards: 'total_questions', a
+      'difficulties' histogram ({difficulty: questions}) and per category
+      id its 'type', 'questions' and 'difficulties'. Read from the
+      question_stats aggregates, see stats.py.
   '''
+  @app.route('/stats')
+  def get_stats():
+    categories, _ = category_cache.get()
+    stats = question_stats(categories)
+    stats['success'] = True
+    return json_response(stats)
+
+  @app.errorhandler(400)
+  def bad_request(error):
+    return jsonify({
+      'success': False,
+      'error': 400,
+      'message': 'bad request'
+    }), 400
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return jsonify({
+      'success': False,
+      'error': 404,
+      'message': 'resource not found'
+    }), 404
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return jsonify({
+      'success': False,
+      'error': 422,
+      'message': 'unprocessable'
+    }), 422
+
+  @app.errorhandler(500)
+  def server_error(error):
+    return jsonify({
+      'success': False,
+      'error': 500,
+      'message': 'internal server error'
+    }), 500
   
   return app
 
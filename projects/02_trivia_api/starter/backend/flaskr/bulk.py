@@ -0,0 +1,245 @@
+import csv
+import io
+import json
+import os
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from models import connect
+
+'''
+Bulk loading and dumping of the question bank, registered as
+
+  flask trivia import questions.json [--batch-size 5000]
+  flask trivia export [questions.ndjson]
+
+Imports read JSON arrays, NDJSON or CSV (columns question, answer,
+category, difficulty) a batch at a time, so files of any size run in
+constant memory. Each batch is COPYed into a temporary staging table and
+moved into questions with a single INSERT ... SELECT that skips questions
+whose text is already in the bank (or earlier in the same batch) and
+rejects those of unknown categories, then committed. Questions get their
+ids in file order. Exports stream the table through a server-side cursor
+as one JSON object per line, the same format import reads back.
+
+Running apps pick up imported questions on their next quiz index refresh,
+see quiz.py.
+'''
+
+BATCH_SIZE = 5000
+COLUMNS = ('question', 'answer', 'difficulty', 'category')
+# the staging table also records where each row was in the file
+STAGING_COLUMNS = ('position',) + COLUMNS
+
+trivia_cli = AppGroup('trivia', help='Manage the question bank.')
+
+'''
+iter_json_array(f)
+    yields the objects of a top-level JSON array one at a time, reading the
+    file in chunks instead of parsing it whole
+'''
+def iter_json_array(f, chunk_size=65536):
+  decoder = json.JSONDecoder()
+  buffer = ''
+  started = False
+  eof = False
+  while True:
+    buffer = buffer.lstrip()
+    if not started and buffer:
+      if buffer[0] != '[':
+        raise ValueError('expected a JSON array')
+      buffer = buffer[1:]
+      started = True
+      continue
+    if started and buffer[:1] == ',':
+      buffer = buffer[1:]
+      continue
+    if started and buffer[:1] == ']':
+      return
+    if buffer:
+      try:
+        item, end = decoder.raw_decode(buffer)
+      except ValueError:
+        # the object runs past the end of the buffer, read more of it
+        if eof:
+          raise
+      else:
+        # a number at the very end of the buffer may continue in the next chunk
+        if end < len(buffer) or eof:
+          yield item
+          buffer = buffer[end:]
+          continue
+    if eof:
+      raise ValueError('unexpected end of the JSON array')
+    chunk = f.read(chunk_size)
+    eof = not chunk
+    buffer += chunk
+
+def iter_ndjson(f):
+  for line in f:
+    if line.strip():
+      yield json.loads(line)
+
+def iter_records(f, fmt):
+  if fmt == 'csv':
+    return csv.DictReader(f)
+  if fmt == 'ndjson':
+    return iter_ndjson(f)
+  return iter_json_array(f)
+
+def detect_format(path):
+  ext = os.path.splitext(path)[1].lower()
+  if ext == '.csv':
+    return 'csv'
+  if ext in ('.ndjson', '.jsonl'):
+    return 'ndjson'
+  if ext == '.json':
+    return 'json'
+  # stdin and unknown extensions
+  return 'ndjson'
+
+'''
+clean_record(record)
+    returns the (question, answer, difficulty, category) row of an imported
+    record, or None when it has no question or answer text or a
+    non-numeric difficulty or category
+'''
+def clean_record(record):
+  question = (record.get('question') or '').strip()
+  answer = (record.get('answer') or '').strip()
+  if not question or not answer:
+    return None
+  try:
+    difficulty = int(record.get('difficulty') or 1)
+    category = int(record['category'])
+  except (KeyError, TypeError, ValueError):
+    return None
+  return (question, answer, difficulty, category)
+
+def batches(rows, size):
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+def copy_rows(connection, rows):
+  # COPY through psycopg2 when available, executemany otherwise
+  cursor = connection.connection.cursor()
+  if hasattr(cursor, 'copy_expert'):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+      'COPY question_import ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(STAGING_COLUMNS)),
+      buffer
+    )
+  else:
+    connection.execute(
+      text('INSERT INTO question_import ({}) VALUES ({})'.format(
+        ', '.join(STAGING_COLUMNS), ', '.join(':' + column for column in STAGING_COLUMNS))),
+      [dict(zip(STAGING_COLUMNS, row)) for row in rows]
+    )
+
+'''
+import_questions(f, fmt, batch_size)
+    loads the records of `f` into questions, batch_size rows per
+    transaction; returns (read, inserted, rejected) counts. Questions whose
+    text is already in the bank are skipped, so re-running an import only
+    adds what is new; invalid records and questions of categories that do
+    not exist are rejected.
+'''
+def import_questions(f, fmt, batch_size=BATCH_SIZE):
+  read = inserted = rejected = 0
+  with connect() as connection:
+    with connection.begin():
+      # makes the duplicate check an index lookup instead of a scan
+      connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_questions_question_md5 ON questions (md5(question))'
+      ))
+      connection.execute(text(
+        'CREATE TEMP TABLE IF NOT EXISTS question_import ON COMMIT DELETE ROWS AS '
+        'SELECT 0 AS position, {} FROM questions WITH NO DATA'.format(', '.join(COLUMNS))
+      ))
+    for batch in batches(iter_records(f, fmt), batch_size):
+      rows = [(read + position,) + row for position, row in enumerate(map(clean_record, batch)) if row is not None]
+      read += len(batch)
+      rejected += len(batch) - len(rows)
+      if not rows:
+        continue
+      with connection.begin():
+        # ON COMMIT DELETE ROWS does not apply when the import runs inside
+        # an outer transaction (the tests), so the table is emptied here
+        connection.execute(text('TRUNCATE question_import'))
+        copy_rows(connection, rows)
+        rejected += connection.execute(text(
+          'SELECT count(*) FROM question_import i '
+          'WHERE NOT EXISTS (SELECT 1 FROM categories c WHERE c.id = i.category)'
+        )).scalar()
+        # the first occurrence of each new question of a known category,
+        # inserted in file order
+        result = connection.execute(text(
+          'INSERT INTO questions ({0}) '
+          'SELECT {0} FROM ('
+          '  SELECT DISTINCT ON (i.question) i.* FROM question_import i '
+          '  JOIN categories c ON c.id = i.category '
+          '  WHERE NOT EXISTS ('
+          '    SELECT 1 FROM questions q '
+          '    WHERE md5(q.question) = md5(i.question) AND q.question = i.question'
+          '  ) ORDER BY i.question, i.position'
+          ') first ORDER BY position'.format(', '.join(COLUMNS))
+        ))
+        inserted += result.rowcount
+  return read, inserted, rejected
+
+'''
+export_questions(f, batch_size)
+    writes every question to `f` as NDJSON in id order, fetching
+    batch_size rows at a time from a server-side cursor; returns the
+    number of rows written
+'''
+def export_questions(f, batch_size=BATCH_SIZE):
+  written = 0
+  with connect() as connection:
+    result = connection.execution_options(stream_results=True).execute(text(
+      'SELECT id, {} FROM questions ORDER BY id'.format(', '.join(COLUMNS))
+    ))
+    while True:
+      rows = result.fetchmany(batch_size)
+      if not rows:
+        break
+      f.write(''.join(json.dumps(dict(row)) + '\n' for row in rows))
+      written += len(rows)
+  return written
+
+def report(action, rows, elapsed):
+  # on stderr, so it does not end up in an export written to stdout
+  click.echo('{} {} rows in {:.2f}s ({:.0f} rows/sec)'.format(
+    action, rows, elapsed, rows / elapsed if elapsed else 0), err=True)
+
+@trivia_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['json', 'ndjson', 'csv']),
+              help='Defaults to the file extension, NDJSON for stdin.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def import_command(source, fmt, batch_size):
+  start = time.perf_counter()
+  # stdin has no name when it is not a real file, e.g. under CliRunner
+  path = getattr(source, 'name', '-')
+  read, inserted, rejected = import_questions(source, fmt or detect_format(path), batch_size)
+  report('Read', read, time.perf_counter() - start)
+  click.echo('{} inserted, {} duplicates skipped, {} rejected'.format(
+    inserted, read - rejected - inserted, rejected), err=True)
+
+@trivia_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def export_command(target, batch_size):
+  start = time.perf_counter()
+  written = export_questions(target, batch_size)
+  report('Exported', written, time.perf_counter() - start)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import db, Category, QuestionStat
+
+'''
+CategoryCache
+    the categories as served by /categories ({id: type}), kept in process
+    memory. Category.insert/update/delete bump `version` through the
+    app's category listeners (models.notify) and the next get() reloads;
+    `ttl` bounds how long a write made by another process can go
+    unnoticed.
+
+    The ETag is a hash of the content, so every process hands out the same
+    tag for the same categories and clients can revalidate against any of
+    them.
+'''
+class CategoryCache(object):
+  def __init__(self, ttl=300):
+    self.ttl = ttl
+    self.version = 0
+    self._cached = None
+    self._lock = threading.Lock()
+
+  def on_category_change(self, action, category_id):
+    with self._lock:
+      self.version += 1
+
+  def get(self):
+    '''
+    returns ({id: type}, etag)
+    '''
+    cached = self._cached
+    if cached is not None and cached[0] == self.version and cached[1] > time.monotonic():
+      return cached[2], cached[3]
+    version = self.version
+    categories = {category.id: category.type for category in Category.query.order_by(Category.id).all()}
+    etag = hashlib.sha1(json.dumps(categories, sort_keys=True).encode('utf-8')).hexdigest()
+    self._cached = (version, time.monotonic() + self.ttl, categories, etag)
+    return categories, etag
+
+
+'''
+QuestionCounts
+    number of questions per category, read with a single grouped query
+    over the question_stats aggregates (see stats.py) instead of one count
+    per category. Cached like CategoryCache: Question.insert/delete
+    invalidate it through the app's question listeners (models.notify)
+    and `ttl` covers writes of other processes.
+'''
+class QuestionCounts(object):
+  def __init__(self, ttl=60):
+    self.ttl = ttl
+    self.version = 0
+    self._cached = None
+    self._lock = threading.Lock()
+
+  def on_question_change(self, action, question_id, category):
+    with self._lock:
+      self.version += 1
+
+  def get(self):
+    '''
+    returns {category_id: number of questions}; categories without
+    questions are left out
+    '''
+    cached = self._cached
+    if cached is not None and cached[0] == self.version and cached[1] > time.monotonic():
+      return cached[2]
+    version = self.version
+    counts = dict(
+      db.session.query(QuestionStat.category, func.sum(QuestionStat.questions)).
+        filter(QuestionStat.category != 0).
+          group_by(QuestionStat.category).
+            having(func.sum(QuestionStat.questions) > 0).all()
+    )
+    self._cached = (version, time.monotonic() + self.ttl, counts)
+    return counts
@@ -0,0 +1,75 @@
+import time
+from collections import namedtuple
+from sqlalchemy import text
+
+'''
+Page
+    items: the rows of the page
+    next_after: key of the last row, to pass back as ?after= for the next
+        page, or None when this is the last page
+'''
+Page = namedtuple('Page', ['items', 'next_after'])
+
+'''
+keyset_page(query, key, after, per_page)
+    returns the page of `query` that starts right after the row whose `key`
+    equals `after` (the first page when `after` is None), as
+    WHERE key > after ORDER BY key LIMIT per_page, so the cost does not
+    depend on how deep into the table the page is
+'''
+def keyset_page(query, key, after=None, per_page=10):
+  if after is not None:
+    query = query.filter(key > after)
+  # one extra row tells us whether there is a next page without a count
+  rows = query.order_by(key).limit(per_page + 1).all()
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    return Page(rows, getattr(rows[-1], key.key))
+  return Page(rows, None)
+
+'''
+offset_page(query, key, page, per_page)
+    numbered page (1-based) for clients that only know page numbers; it
+    still selects per_page + 1 rows but the OFFSET scan grows with the page
+    number, so prefer keyset_page
+'''
+def offset_page(query, key, page=1, per_page=10):
+  rows = query.order_by(key).offset((page - 1) * per_page).limit(per_page + 1).all()
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    return Page(rows, getattr(rows[-1], key.key))
+  return Page(rows, None)
+
+'''
+ApproximateCounter
+    row counts for pagination totals, read from the planner's estimate in
+    pg_class.reltuples instead of SELECT count(*), which has to visit every
+    row. Tables whose estimate is below `exact_below` are small enough to
+    count exactly (and reltuples is unreliable before the first ANALYZE).
+    Results are cached per table for `ttl` seconds; call invalidate() after
+    writes that should show up immediately.
+'''
+class ApproximateCounter(object):
+  def __init__(self, db, ttl=60, exact_below=10000):
+    self.db = db
+    self.ttl = ttl
+    self.exact_below = exact_below
+    self._cache = {}
+
+  def count(self, model):
+    table = model.__tablename__
+    cached = self._cache.get(table)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+      return cached[1]
+    estimate = self.db.session.execute(
+      text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'),
+      {'table': table}
+    ).scalar()
+    if estimate is None or estimate < self.exact_below:
+      estimate = model.query.order_by(None).count()
+    self._cache[table] = (now + self.ttl, estimate)
+    return estimate
+
+  def invalidate(self, model):
+    self._cache.pop(model.__tablename__, None)
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+
+from models import Question
+
+'''
+QuizSampler
+    picks a random question, optionally within a category, that is not in
+    the quiz's previous questions.
+
+    Question ids are kept in memory as one array per category plus one for
+    all questions, with an id -> index map so an id can be removed by
+    swapping it with the last element. Sampling swaps the previous ids to
+    the end of the array the same way and picks a random position before
+    them, so a request costs O(len(previous ids)) work no matter how many
+    questions there are, plus a primary key lookup to load the chosen row.
+
+    Question.insert() and Question.delete() keep the arrays current through
+    the app's question listeners (models.notify); the whole index is also
+    reloaded every `refresh_interval` seconds to pick up writes made by
+    other processes. Changes notified while a reload is running are
+    recorded and applied again to the new arrays, which were read from a
+    snapshot that may predate them.
+    Until the first load has finished, questions come from a TABLESAMPLE
+    query instead. With background=False (used by the tests) loads run in
+    the request instead of a thread.
+'''
+class QuizSampler(object):
+  # TABLESAMPLE SYSTEM percentage used while the index is cold
+  sample_percent = 1
+
+  def __init__(self, db, refresh_interval=300, background=True):
+    self.db = db
+    self.refresh_interval = refresh_interval
+    self.background = background
+    self.loaded_at = None
+    self._ids = {}
+    self._positions = {}
+    self._lock = threading.Lock()
+    self._refreshing = False
+    # (action, question_id, category) notified since the running reload began
+    self._pending = None
+
+  def load(self, rows):
+    # rows are (id, category) pairs
+    ids = {None: []}
+    positions = {None: {}}
+    for question_id, category in rows:
+      for key in (None, str(category)):
+        bucket = ids.setdefault(key, [])
+        positions.setdefault(key, {})[question_id] = len(bucket)
+        bucket.append(question_id)
+    with self._lock:
+      self._ids = ids
+      self._positions = positions
+      for change in self._pending or ():
+        self._apply(*change)
+      self._pending = None
+      self.loaded_at = time.monotonic()
+
+  def refresh(self):
+    # recording starts before the query, so a write committed after its
+    # snapshot was taken is always among the pending changes
+    with self._lock:
+      if self._pending is None:
+        self._pending = []
+    try:
+      self.load(self.db.session.query(Question.id, Question.category).yield_per(10000))
+    except Exception:
+      with self._lock:
+        self._pending = None
+      raise
+
+  def refresh_in_background(self):
+    with self._lock:
+      if self._refreshing:
+        return
+      self._refreshing = True
+    app = current_app._get_current_object()
+
+    def run():
+      try:
+        with app.app_context():
+          self.refresh()
+      finally:
+        self._refreshing = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+  @property
+  def cold(self):
+    return self.loaded_at is None
+
+  def _add(self, question_id, category):
+    for key in (None, str(category)):
+      positions = self._positions.setdefault(key, {})
+      if question_id not in positions:
+        bucket = self._ids.setdefault(key, [])
+        positions[question_id] = len(bucket)
+        bucket.append(question_id)
+
+  def _remove(self, question_id, category=None):
+    # without a category the id is looked for in every array
+    keys = list(self._positions) if category is None else (None, str(category))
+    for key in keys:
+      positions = self._positions.get(key, {})
+      index = positions.pop(question_id, None)
+      if index is None:
+        continue
+      bucket = self._ids[key]
+      last = bucket.pop()
+      if last != question_id:
+        bucket[index] = last
+        positions[last] = index
+
+  def _apply(self, action, question_id, category):
+    if action == 'insert':
+      self._add(question_id, category)
+    elif action == 'delete':
+      self._remove(question_id, category)
+
+  def add(self, question_id, category):
+    with self._lock:
+      self._add(question_id, category)
+
+  def remove(self, question_id, category=None):
+    with self._lock:
+      self._remove(question_id, category)
+
+  def on_question_change(self, action, question_id, category):
+    with self._lock:
+      if self._pending is not None:
+        self._pending.append((action, question_id, category))
+      if not self.cold:
+        self._apply(action, question_id, category)
+
+  def sample(self, category=None, previous_ids=()):
+    '''
+    returns a question id from the in-memory index, or None when every
+    question of the category is in previous_ids
+    '''
+    key = None if category is None else str(category)
+    with self._lock:
+      ids = self._ids.get(key, [])
+      positions = self._positions.get(key, {})
+      # the array's order carries no meaning, so the previous ids are left
+      # where they were swapped to
+      end = len(ids)
+      for question_id in set(previous_ids):
+        index = positions.get(question_id)
+        if index is None:
+          continue
+        end -= 1
+        last = ids[end]
+        ids[index], ids[end] = last, question_id
+        positions[last], positions[question_id] = index, end
+      return ids[random.randrange(end)] if end else None
+
+  def sample_from_table(self, category=None, previous_ids=()):
+    '''
+    used while the index is cold: reads a random block sample of the table,
+    falling back to the (slow, exact) ORDER BY random() when the sample
+    holds no usable row, e.g. on small tables
+    '''
+    conditions = ['TRUE']
+    params = {'previous': list(previous_ids) or [-1]}
+    if category is not None:
+      conditions.append('category = :category')
+      params['category'] = int(category)
+    conditions.append('NOT (id = ANY(:previous))')
+    where = ' AND '.join(conditions)
+    question_id = self.db.session.execute(text(
+      'SELECT id FROM questions TABLESAMPLE SYSTEM ({}) WHERE {} LIMIT 1'.format(self.sample_percent, where)
+    ), params).scalar()
+    if question_id is None:
+      question_id = self.db.session.execute(text(
+        'SELECT id FROM questions WHERE {} ORDER BY random() LIMIT 1'.format(where)
+      ), params).scalar()
+    return question_id
+
+  def sample_many(self, category=None, count=1):
+    '''
+    returns up to `count` distinct question ids of the category in random
+    order, e.g. the whole question sequence of a quiz session
+    '''
+    self._refresh_if_stale()
+    if self.cold:
+      picked = []
+      while len(picked) < count:
+        question_id = self.sample_from_table(category, picked)
+        if question_id is None:
+          break
+        picked.append(question_id)
+      return picked
+    with self._lock:
+      ids = self._ids.get(None if category is None else str(category), [])
+      return random.sample(ids, min(count, len(ids)))
+
+  def _refresh_if_stale(self):
+    if self.cold or time.monotonic() - self.loaded_at > self.refresh_interval:
+      if self.background:
+        self.refresh_in_background()
+      else:
+        self.refresh()
+
+  def next_question(self, category=None, previous_ids=()):
+    self._refresh_if_stale()
+    if self.cold:
+      question_id = self.sample_from_table(category, previous_ids)
+      return None if question_id is None else Question.query.get(question_id)
+    previous = set(previous_ids)
+    while True:
+      question_id = self.sample(category, previous)
+      if question_id is None:
+        return None
+      question = Question.query.get(question_id)
+      if question is not None:
+        return question
+      # deleted by another process since the last refresh
+      self.remove(question_id)
+      previous.add(question_id)
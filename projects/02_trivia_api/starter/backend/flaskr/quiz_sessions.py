@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+'''
+QuizSessionStore
+    where quiz sessions live between requests. A session is the shuffled
+    list of question ids picked when the quiz starts plus a position in it,
+    so each "next question" call only moves the position forward instead of
+    the client resending (and the server excluding) every previous question.
+
+    Backends implement create() and next(), which are abstract, so a store
+    missing one fails when it is created; see MemoryQuizSessionStore.
+    create_app() uses the store in app.config['QUIZ_SESSION_STORE'] when set,
+    e.g. one backed by a shared cache when running several processes.
+'''
+class QuizSessionStore(ABC):
+  '''
+  create(question_ids)
+      stores a new session and returns its id
+  '''
+  @abstractmethod
+  def create(self, question_ids):
+    pass
+
+  '''
+  next(session_id)
+      returns the next question id of the session, or None when the quiz
+      is over; raises KeyError for unknown or expired sessions
+  '''
+  @abstractmethod
+  def next(self, session_id):
+    pass
+
+
+'''
+MemoryQuizSessionStore
+    in-process store holding at most `max_sessions` sessions; the least
+    recently used session is evicted first, and a session expires `ttl`
+    seconds after it was last used
+'''
+class MemoryQuizSessionStore(QuizSessionStore):
+  def __init__(self, max_sessions=10000, ttl=3600):
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._sessions)
+
+  def create(self, question_ids):
+    session_id = uuid.uuid4().hex
+    with self._lock:
+      self._evict(time.monotonic())
+      self._sessions[session_id] = [time.monotonic() + self.ttl, list(question_ids), 0]
+    return session_id
+
+  def next(self, session_id):
+    with self._lock:
+      now = time.monotonic()
+      session = self._sessions[session_id]
+      if session[0] <= now:
+        del self._sessions[session_id]
+        raise KeyError(session_id)
+      self._sessions.move_to_end(session_id)
+      session[0] = now + self.ttl
+      expires_at, question_ids, position = session
+      if position >= len(question_ids):
+        return None
+      session[2] = position + 1
+      return question_ids[position]
+
+  def _evict(self, now):
+    # least recently used sessions sit at the front
+    while self._sessions:
+      session_id, session = next(iter(self._sessions.items()))
+      if session[0] > now and len(self._sessions) < self.max_sessions:
+        break
+      del self._sessions[session_id]
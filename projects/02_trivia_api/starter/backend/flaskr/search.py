@@ -0,0 +1,72 @@
+import html
+from sqlalchemy import text
+
+from models import db
+
+'''
+search_questions(term, include_answers, page, per_page)
+    full-text search over the generated question_tsv (and optionally
+    answer_tsv) columns, see models.create_search_index(). The term is
+    parsed with websearch_to_tsquery, so quotes, OR and -word work as on a
+    search engine. Matches are ranked with ts_rank, question matches
+    counting double over answer matches, and each row of the page gets a
+    'highlight' snippet of the question with the matched words in <mark>.
+    The snippet is HTML: the question text in it is escaped, so <mark> and
+    </mark> are the only tags it can contain.
+
+    returns (rows, total) where rows are dicts with the Question.format()
+    keys plus 'rank' and 'highlight'
+'''
+
+# ts_headline marks matches with these control characters, which are
+# removed from the question beforehand and turned into <mark> tags once
+# the rest of the snippet has been escaped
+START_SEL, STOP_SEL = '\x01', '\x02'
+HIGHLIGHT_OPTIONS = 'StartSel="{}", StopSel="{}", MaxWords=35, MinWords=15'.format(START_SEL, STOP_SEL)
+
+def highlight_html(snippet):
+  return html.escape(snippet).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+def search_questions(term, include_answers=False, page=1, per_page=10):
+  if include_answers:
+    match = '(question_tsv @@ query OR answer_tsv @@ query)'
+    rank = 'ts_rank(question_tsv, query) * 2 + ts_rank(answer_tsv, query)'
+  else:
+    match = 'question_tsv @@ query'
+    rank = 'ts_rank(question_tsv, query)'
+  params = {
+    'term': term,
+    'limit': per_page,
+    'offset': (page - 1) * per_page,
+    'options': HIGHLIGHT_OPTIONS,
+    'selectors': START_SEL + STOP_SEL
+  }
+
+  total = db.session.execute(text(
+    "SELECT count(*) FROM questions, websearch_to_tsquery('english', :term) query "
+    "WHERE {}".format(match)
+  ), params).scalar()
+
+  # ts_headline re-parses the text, so it only runs on the rows of the page
+  rows = db.session.execute(text(
+    "SELECT page.id, page.question, page.answer, page.category, page.difficulty, page.rank, "
+    "ts_headline('english', translate(page.question, :selectors, ''), page.query, :options) AS highlight "
+    "FROM ("
+    "  SELECT id, question, answer, category, difficulty, query, {} AS rank "
+    "  FROM questions, websearch_to_tsquery('english', :term) query "
+    "  WHERE {} "
+    "  ORDER BY rank DESC, id "
+    "  LIMIT :limit OFFSET :offset"
+    ") page "
+    "ORDER BY page.rank DESC, page.id".format(rank, match)
+  ), params).fetchall()
+
+  return [{
+    'id': row.id,
+    'question': row.question,
+    'answer': row.answer,
+    'category': row.category,
+    'difficulty': row.difficulty,
+    'rank': row.rank,
+    'highlight': highlight_html(row.highlight)
+  } for row in rows], total
@@ -0,0 +1,51 @@
+import json
+from flask import current_app
+
+from models import db, Question
+
+# optional: without orjson responses are encoded by the json module
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+'''
+Serialization for the list endpoints. Pages are read as plain column
+tuples instead of Question instances, which skips building ORM objects,
+their instance state and identity map entries only to turn them into
+dicts again, and the payload is encoded with orjson when it is installed.
+benchmarks/serialization.py compares this with Question.query + format().
+'''
+
+# same keys, in the same order, as Question.format()
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+QUESTION_KEYS = tuple(column.key for column in QUESTION_COLUMNS)
+
+'''
+question_rows()
+    query of (id, question, answer, category, difficulty) tuples, to be
+    filtered and paged like Question.query; rows still have .id etc.
+'''
+def question_rows():
+  return db.session.query(*QUESTION_COLUMNS)
+
+'''
+format_questions(rows)
+    the Question.format() dicts of question_rows() tuples
+'''
+def format_questions(rows):
+  keys = QUESTION_KEYS
+  return [dict(zip(keys, row)) for row in rows]
+
+def dumps(payload):
+  if orjson is not None:
+    # category ids are int keys, which jsonify also turns into strings
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+  return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+'''
+json_response(payload, status)
+    jsonify() replacement for the list endpoints
+'''
+def json_response(payload, status=200):
+  return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
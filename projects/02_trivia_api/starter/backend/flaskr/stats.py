@@ -0,0 +1,76 @@
+import click
+from sqlalchemy import text
+
+from models import connect, QuestionStat, rebuild_question_stats
+from .bulk import trivia_cli
+
+'''
+Question statistics for the quiz dashboards, read from the question_stats
+aggregate table that triggers on questions keep current (see
+models.create_question_stats_triggers), so no request has to GROUP BY over
+the questions themselves.
+'''
+
+'''
+question_stats(categories)
+    returns the /stats payload: the total, a difficulty histogram over all
+    questions and, per category id of `categories` ({id: type}), its type,
+    question count and difficulty histogram. Questions without a category
+    are counted under id 0.
+'''
+def question_stats(categories):
+  by_category = {}
+  difficulties = {}
+  total = 0
+  for stat in QuestionStat.query.filter(QuestionStat.questions > 0).all():
+    category = by_category.setdefault(stat.category, {
+      'type': categories.get(stat.category),
+      'questions': 0,
+      'difficulties': {}
+    })
+    category['questions'] += stat.questions
+    category['difficulties'][stat.difficulty] = stat.questions
+    difficulties[stat.difficulty] = difficulties.get(stat.difficulty, 0) + stat.questions
+    total += stat.questions
+  for category_id, category_type in categories.items():
+    by_category.setdefault(category_id, {'type': category_type, 'questions': 0, 'difficulties': {}})
+  return {
+    'total_questions': total,
+    'difficulties': difficulties,
+    'categories': by_category
+  }
+
+'''
+compare_question_stats(connection)
+    returns [(category, difficulty, stored, actual)] for every group whose
+    count in question_stats differs from a recount of questions
+'''
+def compare_question_stats(connection):
+  return connection.execute(text(
+    'SELECT category, difficulty, coalesce(s.questions, 0), coalesce(q.questions, 0) '
+    'FROM (SELECT category, difficulty, questions FROM question_stats WHERE questions <> 0) s '
+    'FULL JOIN ('
+    '  SELECT coalesce(category, 0) AS category, coalesce(difficulty, 0) AS difficulty, count(*) AS questions '
+    '  FROM questions GROUP BY 1, 2'
+    ') q USING (category, difficulty) '
+    'WHERE coalesce(s.questions, 0) <> coalesce(q.questions, 0) '
+    'ORDER BY category, difficulty'
+  )).fetchall()
+
+@trivia_cli.command('check-stats')
+@click.option('--fix', is_flag=True, help='Rebuild question_stats when it is off.')
+def check_stats_command(fix):
+  with connect() as connection, connection.begin():
+    # holds off writers so the recount and the table describe the same rows
+    connection.execute(text('LOCK TABLE questions IN SHARE MODE'))
+    differences = compare_question_stats(connection)
+    for category, difficulty, stored, actual in differences:
+      click.echo('category {} difficulty {}: {} stored, {} counted'.format(category, difficulty, stored, actual))
+    if not differences:
+      click.echo('question_stats is consistent')
+      return
+    if fix:
+      rebuild_question_stats(connection)
+      click.echo('question_stats rebuilt')
+  if not fix:
+    click.get_current_context().exit(1)
@@ -1,5 +1,8 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from contextlib import contextmanager
+from flask import current_app, has_app_context
+from sqlalchemy import Column, String, Integer, ForeignKey, create_engine, text
+from sqlalchemy.engine import Connection
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -17,7 +20,178 @@ def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
+    # see notify(); kept on the app so listeners go away with it
+    app.extensions['trivia_listeners'] = {'question': [], 'category': []}
     db.create_all()
+    upgrade_question_category()
+    create_search_index()
+    create_question_stats_triggers()
+
+'''
+connect()
+    context manager giving a connection for work done outside the ORM
+    session, such as the bulk import, export and check-stats commands.
+    When the session is bound to a connection rather than the engine, as
+    in test_flaskr.py, that connection is used, so the work joins its
+    transaction; otherwise a new connection is taken from the engine.
+'''
+@contextmanager
+def connect():
+    bind = db.session.get_bind()
+    if isinstance(bind, Connection):
+        yield bind
+    else:
+        with bind.connect() as connection:
+            yield connection
+
+'''
+upgrade_question_category()
+    brings databases whose questions.category was created as a text column
+    (by db.create_all() with earlier versions of this model) in line with
+    trivia.psql: an integer foreign key to categories.id, with questions of
+    unknown categories left without one. Also adds the index on the
+    column, which trivia.psql did not have. Safe to run on every start.
+'''
+def upgrade_question_category():
+    with db.engine.begin() as connection:
+        data_type = connection.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'questions' AND column_name = 'category'"
+        )).scalar()
+        if data_type != 'integer':
+            connection.execute(text(
+                "ALTER TABLE questions ALTER COLUMN category TYPE integer "
+                "USING CASE WHEN category ~ '^[0-9]+$' THEN category::integer END"
+            ))
+            connection.execute(text(
+                'UPDATE questions SET category = NULL '
+                'WHERE category NOT IN (SELECT id FROM categories)'
+            ))
+            connection.execute(text(
+                'ALTER TABLE questions ADD CONSTRAINT category FOREIGN KEY (category) '
+                'REFERENCES categories (id) ON UPDATE CASCADE ON DELETE SET NULL'
+            ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_questions_category ON questions (category)'
+        ))
+
+'''
+create_search_index()
+    adds generated tsvector columns for the question and answer text with a
+    GIN index on each (PostgreSQL 12+), used by the full-text search in
+    flaskr/search.py. The columns are not mapped on Question because
+    generated columns can't be written to. Safe to run on every start.
+'''
+def create_search_index():
+    with db.engine.begin() as connection:
+        # ALTER TABLE and CREATE INDEX lock questions even when there is
+        # nothing to do, so only missing columns and indexes are created
+        columns = {row[0] for row in connection.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'questions'"
+        ))}
+        indexes = {row[0] for row in connection.execute(text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = 'questions'"
+        ))}
+        for column, source in (('question_tsv', 'question'), ('answer_tsv', 'answer')):
+            if column not in columns:
+                connection.execute(text(
+                    "ALTER TABLE questions ADD COLUMN IF NOT EXISTS {} tsvector "
+                    "GENERATED ALWAYS AS (to_tsvector('english', coalesce({}, ''))) STORED".format(column, source)
+                ))
+            if 'ix_questions_' + column not in indexes:
+                connection.execute(text(
+                    'CREATE INDEX IF NOT EXISTS ix_questions_{0} ON questions USING GIN ({0})'.format(column)
+                ))
+
+'''
+create_question_stats_triggers()
+    keeps question_stats (see QuestionStat) current with statement-level
+    triggers on questions. Each INSERT, UPDATE or DELETE statement applies
+    its net change per (category, difficulty) from the transition tables,
+    so a bulk import costs one upsert per group rather than one per row,
+    and writes that bypass the models are counted as well. The first run
+    fills the table from scratch; `flask trivia check-stats` compares it
+    with a full recount. Safe to run on every start.
+'''
+def create_question_stats_triggers():
+    with db.engine.begin() as connection:
+        installed = connection.execute(text(
+            "SELECT count(*) FROM pg_trigger WHERE tgname LIKE 'question_stats_%'"
+        )).scalar()
+        if installed == 4:
+            return
+        # no question can be written between the recount and the triggers
+        connection.execute(text('LOCK TABLE questions IN SHARE ROW EXCLUSIVE MODE'))
+        connection.execute(text('''
+            CREATE OR REPLACE FUNCTION question_stats_apply() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+              IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO question_stats (category, difficulty, questions)
+                SELECT coalesce(category, 0), coalesce(difficulty, 0), -count(*)
+                FROM old_rows GROUP BY 1, 2
+                ON CONFLICT (category, difficulty)
+                DO UPDATE SET questions = question_stats.questions + excluded.questions;
+              END IF;
+              IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO question_stats (category, difficulty, questions)
+                SELECT coalesce(category, 0), coalesce(difficulty, 0), count(*)
+                FROM new_rows GROUP BY 1, 2
+                ON CONFLICT (category, difficulty)
+                DO UPDATE SET questions = question_stats.questions + excluded.questions;
+              END IF;
+              IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM question_stats;
+              END IF;
+              RETURN NULL;
+            END
+            $$
+        '''))
+        for event, transition in (
+                ('INSERT', 'NEW TABLE AS new_rows'),
+                ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+                ('DELETE', 'OLD TABLE AS old_rows'),
+                ('TRUNCATE', None)):
+            name = 'question_stats_{}'.format(event.lower())
+            connection.execute(text('DROP TRIGGER IF EXISTS {} ON questions'.format(name)))
+            connection.execute(text(
+                'CREATE TRIGGER {} AFTER {} ON questions {} FOR EACH STATEMENT '
+                'EXECUTE FUNCTION question_stats_apply()'.format(
+                    name, event, 'REFERENCING ' + transition if transition else '')
+            ))
+        rebuild_question_stats(connection)
+
+'''
+rebuild_question_stats(connection)
+    recounts question_stats from the questions table
+'''
+def rebuild_question_stats(connection):
+    connection.execute(text('DELETE FROM question_stats'))
+    connection.execute(text(
+        'INSERT INTO question_stats (category, difficulty, questions) '
+        'SELECT coalesce(category, 0), coalesce(difficulty, 0), count(*) '
+        'FROM questions GROUP BY 1, 2'
+    ))
+
+'''
+notify(kind, *args)
+    runs the current app's listeners of `kind`, which setup_db() keeps in
+    app.extensions['trivia_listeners'], once a write has committed, e.g. to
+    keep in-memory indexes of the questions current:
+        'question' listeners are called as listener(action, question_id,
+            category) after Question.insert() ('insert') or
+            Question.delete() ('delete')
+        'category' listeners are called as listener(action, category_id)
+            after Category.insert(), update() or delete()
+    Every app created by create_app() registers its own listeners, so they
+    only ever see the writes made through that app.
+'''
+def notify(kind, *args):
+    app = current_app if has_app_context() else db.app
+    for listener in app.extensions['trivia_listeners'][kind]:
+        listener(*args)
 
 '''
 Question
@@ -29,7 +203,7 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer, ForeignKey('categories.id', name='category', onupdate='CASCADE', ondelete='SET NULL'), index=True)
   difficulty = Column(Integer)
 
   def __init__(self, question, answer, category, difficulty):
@@ -41,13 +215,16 @@ class Question(db.Model):
   def insert(self):
     db.session.add(self)
     db.session.commit()
+    notify('question', 'insert', self.id, self.category)
   
   def update(self):
     db.session.commit()
 
   def delete(self):
+    question_id, category = self.id, self.category
     db.session.delete(self)
     db.session.commit()
+    notify('question', 'delete', question_id, category)
 
   def format(self):
     return {
@@ -71,8 +248,43 @@ class Category(db.Model):
   def __init__(self, type):
     self.type = type
 
+  def insert(self):
+    db.session.add(self)
+    db.session.commit()
+    notify('category', 'insert', self.id)
+
+  def update(self):
+    db.session.commit()
+    notify('category', 'update', self.id)
+
+  def delete(self):
+    category_id = self.id
+    db.session.delete(self)
+    db.session.commit()
+    notify('category', 'delete', category_id)
+
   def format(self):
     return {
       'id': self.id,
       'type': self.type
-    }
\ No newline at end of file
+    }
+
+'''
+QuestionStat
+    number of questions per category and difficulty, maintained by the
+    triggers of create_question_stats_triggers(); category and difficulty
+    are 0 for questions without one
+'''
+class QuestionStat(db.Model):
+  __tablename__ = 'question_stats'
+
+  category = Column(Integer, primary_key=True, autoincrement=False)
+  difficulty = Column(Integer, primary_key=True, autoincrement=False)
+  questions = Column(Integer, nullable=False, default=0)
+
+  def format(self):
+    return {
+      'category': self.category,
+      'difficulty': self.difficulty,
+      'questions': self.questions
+    }
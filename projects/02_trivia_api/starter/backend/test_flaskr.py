@@ -1,39 +1,361 @@
 import os
+import subprocess
 import unittest
 import json
-from flask_sqlalchemy import SQLAlchemy
+import re
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.quiz import QuizSampler
+from models import db, Question, Category
+
+database_path = os.environ.get('TRIVIA_TEST_DATABASE', 'postgres://localhost:5432/trivia_test')
+trivia_psql = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trivia.psql')
+
+app = None
+connection = None
+transaction = None
+default_session = None
+
+
+def setUpModule():
+    """Load trivia.psql into a fresh schema and open the connection every test runs on.
+
+    This runs once for the whole suite. Each test then runs inside a
+    SAVEPOINT on that connection which is rolled back in tearDown, so no
+    test sees another one's writes and none has to rebuild the database.
+    """
+    global app, connection, transaction, default_session
+    # the schema is dropped, so never run against anything but a test database
+    if not (make_url(database_path).database or '').endswith('_test'):
+        raise RuntimeError('TRIVIA_TEST_DATABASE must name a database ending in _test, not {}'.format(database_path))
+    engine = create_engine(database_path)
+    with engine.begin() as setup:
+        setup.execute('DROP SCHEMA public CASCADE')
+        setup.execute('CREATE SCHEMA public')
+    engine.dispose()
+    # the dump contains COPY ... FROM stdin blocks, which only psql can run;
+    # its ALTER ... OWNER TO statements name the author's role, so they are
+    # left out and any other error stops the load
+    with open(trivia_psql) as f:
+        dump = re.sub(r'(?m)^ALTER [^;]* OWNER TO [^;]*;$', '', f.read())
+    subprocess.run(['psql', '--quiet', '-v', 'ON_ERROR_STOP=1', '--dbname', database_path],
+                   input=dump, universal_newlines=True, check=True, stdout=subprocess.DEVNULL)
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_path, 'TESTING': True})
+    with app.app_context():
+        connection = db.engine.connect()
+    transaction = connection.begin()
+    # sessions join the transaction of the connection, so their commits
+    # only end a subtransaction and never reach the database
+    default_session = db.session
+    db.session = db.create_scoped_session(options={'bind': connection, 'binds': {}})
+
+
+def tearDownModule():
+    db.session.remove()
+    db.session = default_session
+    transaction.rollback()
+    connection.close()
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
-        """Define test variables and initialize app."""
-        self.app = create_app()
+        """Define test variables and start the test's savepoint."""
+        self.app = app
         self.client = self.app.test_client
-        self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        self.savepoint = connection.begin_nested()
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
-    
     def tearDown(self):
-        """Executed after reach test"""
-        pass
+        """Undo everything the test wrote."""
+        db.session.remove()
+        if self.savepoint.is_active:
+            self.savepoint.rollback()
 
     """
     TODO
     Write at least one test for each test for successful operation and for expected errors.
     """
 
+    def test_get_paginated_questions(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['total_questions'])
+        self.assertTrue(len(data['questions']) <= 10)
+        self.assertTrue(len(data['categories']))
+
+    def test_get_questions_after_cursor(self):
+        first = json.loads(self.client().get('/questions').data)
+        res = self.client().get('/questions?after={}'.format(first['next_after']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all(q['id'] > first['next_after'] for q in data['questions']))
+        self.assertEqual(data['questions'], json.loads(self.client().get('/questions?page=2').data)['questions'])
+
+    def test_404_requesting_beyond_valid_page(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
+
+    def test_play_quiz(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [],
+            'quiz_category': {'type': 'Science', 'id': 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(str(data['question']['category']), '1')
+
+    def test_play_quiz_skips_previous_questions(self):
+        with self.app.app_context():
+            science = [q.id for q in Question.query.filter(Question.category == 1).all()]
+        res = self.client().post('/quizzes', json={
+            'previous_questions': science[1:],
+            'quiz_category': {'type': 'Science', 'id': 1}})
+        data = json.loads(res.data)
+
+        self.assertEqual(data['question']['id'], science[0])
+
+        res = self.client().post('/quizzes', json={
+            'previous_questions': science,
+            'quiz_category': {'type': 'Science', 'id': 1}})
+        self.assertIsNone(json.loads(res.data)['question'])
+
+    def test_400_play_quiz_without_body(self):
+        res = self.client().post('/quizzes')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_quiz_session(self):
+        res = self.client().post('/quizzes', json={
+            'quiz_category': {'type': 'Science', 'id': 1},
+            'length': 2})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 2)
+
+        seen = set()
+        for _ in range(2):
+            question = json.loads(self.client().post('/quizzes/{}/next'.format(data['quiz_id'])).data)['question']
+            self.assertEqual(str(question['category']), '1')
+            seen.add(question['id'])
+        self.assertEqual(len(seen), 2)
+
+        res = self.client().post('/quizzes/{}/next'.format(data['quiz_id']))
+        self.assertIsNone(json.loads(res.data)['question'])
+
+    def test_404_unknown_quiz_session(self):
+        res = self.client().post('/quizzes/not-a-session/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_get_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(len(data['categories']))
+        self.assertTrue(res.headers.get('ETag'))
+
+    def test_304_categories_not_modified(self):
+        etag = self.client().get('/categories').headers['ETag']
+        res = self.client().get('/categories', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_categories_etag_changes_on_write(self):
+        etag = self.client().get('/categories').headers['ETag']
+        with self.app.app_context():
+            category = Category(type='Music')
+            category.insert()
+            res = self.client().get('/categories', headers={'If-None-Match': etag})
+            category.delete()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Music', json.loads(res.data)['categories'].values())
+
+    def test_get_questions_by_category(self):
+        res = self.client().get('/categories/4/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['current_category'], 'History')
+        self.assertTrue(all(q['category'] == 4 for q in data['questions']))
+        self.assertEqual(data['total_questions'], data['question_counts']['4'])
+
+    def test_404_questions_of_unknown_category(self):
+        res = self.client().get('/categories/1000/questions')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_get_stats(self):
+        res = self.client().get('/stats')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(data['total_questions'], Question.query.count())
+        self.assertEqual(data['categories']['4']['type'], 'History')
+        self.assertEqual(sum(data['difficulties'].values()), data['total_questions'])
+
+    def test_stats_follow_question_writes(self):
+        before = json.loads(self.client().get('/stats').data)
+        with self.app.app_context():
+            Question('Is this counted?', 'Yes', 4, 5).insert()
+        after = json.loads(self.client().get('/stats').data)
+
+        self.assertEqual(after['total_questions'], before['total_questions'] + 1)
+        self.assertEqual(after['categories']['4']['difficulties']['5'],
+                         before['categories']['4']['difficulties'].get('5', 0) + 1)
+
+    def test_check_stats(self):
+        res = self.app.test_cli_runner().invoke(args=['trivia', 'check-stats'])
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn('consistent', res.output)
+
+    def test_search_questions(self):
+        res = self.client().post('/questions', json={'searchTerm': 'title'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['total_questions'])
+        self.assertIn('<mark>', data['questions'][0]['highlight'])
+        ranks = [q['rank'] for q in data['questions']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_search_questions_including_answers(self):
+        questions_only = json.loads(self.client().post('/questions', json={
+            'searchTerm': 'Lake Victoria'}).data)
+        with_answers = json.loads(self.client().post('/questions', json={
+            'searchTerm': 'Lake Victoria', 'include_answers': True}).data)
+
+        self.assertGreater(with_answers['total_questions'], questions_only['total_questions'])
+
+    def test_search_questions_without_results(self):
+        res = self.client().post('/questions', json={'searchTerm': 'xyzzyplugh'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 0)
+        self.assertEqual(data['questions'], [])
+
+    def test_search_questions_with_invalid_term(self):
+        res = self.client().post('/questions', json={'searchTerm': ['title']})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_search_highlight_is_escaped(self):
+        with self.app.app_context():
+            Question('Is <script>alert(1)</script> a < b & c harpsichord?', 'No', 1, 1).insert()
+        res = self.client().post('/questions', json={'searchTerm': 'harpsichord'})
+        highlight = json.loads(res.data)['questions'][0]['highlight']
+
+        # ts_headline drops tags itself, but not a bare < or &
+        self.assertNotIn('<script>', highlight)
+        self.assertIn('&lt;', highlight)
+        self.assertIn('&amp;', highlight)
+        self.assertIn('<mark>harpsichord</mark>', highlight)
+
+    def test_import_skips_duplicate_and_invalid_questions(self):
+        records = [
+            {'question': "Whose autobiography is entitled 'I Know Why the Caged Bird Sings'?",
+             'answer': 'Maya Angelou', 'category': 4, 'difficulty': 2},
+            {'question': 'Missing an answer?', 'category': 1, 'difficulty': 1},
+            {'question': 'Of an unknown category?', 'answer': 'Yes', 'category': 999, 'difficulty': 1},
+            {'question': 'Zebras are native to which continent?', 'answer': 'Africa', 'category': 1, 'difficulty': 1},
+            {'question': 'Aardvarks are native to which continent?', 'answer': 'Africa', 'category': 1, 'difficulty': 1},
+        ]
+        res = self.app.test_cli_runner().invoke(
+            args=['trivia', 'import', '-'],
+            input=''.join(json.dumps(record) + '\n' for record in records))
+
+        self.assertEqual(res.exit_code, 0)
+        self.assertIn('2 inserted, 1 duplicates skipped, 2 rejected', res.output)
+        with self.app.app_context():
+            zebra = Question.query.filter(Question.question.like('Zebras%')).one()
+            aardvark = Question.query.filter(Question.question.like('Aardvarks%')).one()
+        # ids follow the file, not the alphabet
+        self.assertLess(zebra.id, aardvark.id)
+
+    def test_export_questions(self):
+        res = self.app.test_cli_runner().invoke(args=['trivia', 'export'])
+        lines = [line for line in res.output.splitlines() if line.startswith('{')]
+
+        self.assertEqual(res.exit_code, 0)
+        with self.app.app_context():
+            self.assertEqual(len(lines), Question.query.count())
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'question', 'answer', 'difficulty', 'category'})
+
+class SnapshotDB(object):
+    """Stands in for db in QuizSampler.refresh(): the query returns `rows`,
+    and `during` is called once the reload has started, as writes of other
+    requests would be."""
+
+    def __init__(self, rows, during=lambda: None):
+        self.session = self
+        self.rows = rows
+        self.during = during
+
+    def query(self, *columns):
+        return self
+
+    def yield_per(self, count):
+        self.during()
+        return iter(self.rows)
+
+
+class QuizSamplerTestCase(unittest.TestCase):
+    """The in-memory question index of flaskr/quiz.py"""
+
+    def test_sample_skips_every_previous_question(self):
+        sampler = QuizSampler(SnapshotDB([(question_id, 1) for question_id in range(1, 11)]), background=False)
+        sampler.refresh()
+
+        for _ in range(50):
+            self.assertEqual(sampler.sample(1, range(1, 10)), 10)
+            self.assertEqual(sampler.sample(None, [10, 2, 3, 4, 5, 6, 7, 8, 9]), 1)
+        self.assertIsNone(sampler.sample(1, range(1, 11)))
+        self.assertIsNone(sampler.sample(2))
+        self.assertEqual(sorted(sampler.sample_many(1, 20)), list(range(1, 11)))
+
+    def test_changes_during_a_reload_are_kept(self):
+        sampler = QuizSampler(None, background=False)
+
+        def during():
+            # committed after the reload's snapshot was taken
+            sampler.on_question_change('insert', 3, 1)
+            sampler.on_question_change('delete', 2, 1)
+        sampler.db = SnapshotDB([(1, 1), (2, 1)], during)
+        sampler.refresh()
+
+        self.assertEqual(sorted(sampler.sample_many(1, 10)), [1, 3])
+        self.assertIsNone(sampler._pending)
+        # later changes only go to the index
+        sampler.on_question_change('delete', 1, 1)
+        self.assertEqual(sampler.sample_many(1, 10), [3])
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
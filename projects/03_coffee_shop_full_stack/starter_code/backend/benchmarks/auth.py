@@ -0,0 +1,77 @@
+'''
+Measures token verification throughput of src/auth/auth.py with and
+without the verified-token cache, and the per-request permission check
+(the former list scan with its debug prints against the precompiled set
+check). Tokens come from a LocalIssuer, so no Auth0 tenant or network is
+needed. Run from the backend folder with
+
+  python -m benchmarks.auth
+'''
+import contextlib
+import os
+import time
+
+from auth_kit.local_issuer import LocalIssuer
+from auth_kit.token_cache import TokenCache, verified_token
+
+CLIENTS = 50
+REQUESTS = 2000
+CHECKS = 200000
+PERMISSIONS = ['get:drinks-detail', 'post:drinks', 'patch:drinks', 'delete:drinks']
+
+
+def run(name, tokens):
+    # every client sends its token again and again, as a browser session does
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        auth.verify_token(tokens[i % len(tokens)])
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:10.0f} verifications/s ({:.1f} us each)'.format(
+        name, REQUESTS / elapsed, elapsed / REQUESTS * 1e6))
+
+
+def list_check(permission, payload):
+    # check_permissions() as it was: debug output and a list scan per request
+    print("I am payload: ", payload)
+    print("I am permission: ", permission)
+    print("I am payload['permissions']", payload['permissions'])
+    return permission in payload['permissions']
+
+
+def run_checks():
+    payload = {'permissions': PERMISSIONS}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(CHECKS):
+            list_check('delete:drinks', payload)
+        list_elapsed = time.perf_counter() - start
+
+    check = auth.compile_permissions(['get:drinks-detail', 'delete:drinks'])
+    granted = verified_token(payload).permissions
+    start = time.perf_counter()
+    for _ in range(CHECKS):
+        check(granted)
+    set_elapsed = time.perf_counter() - start
+
+    for name, elapsed in (('list+print', list_elapsed), ('frozenset', set_elapsed)):
+        print('{:<10} {:10.0f} checks/s ({:.2f} us each)'.format(
+            name, CHECKS / elapsed, elapsed / CHECKS * 1e6))
+
+
+def main():
+    global auth
+    with LocalIssuer() as issuer:
+        # the auth module reads its settings when it is imported
+        os.environ.update(issuer.environ)
+        from src.auth import auth
+        tokens = [issuer.issue(PERMISSIONS, subject='client-{}'.format(i)) for i in range(CLIENTS)]
+
+        auth.token_cache = TokenCache(max_entries=0)
+        run('uncached', tokens)
+        auth.token_cache = TokenCache()
+        run('cached', tokens)
+        run_checks()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Throughput of a menu sync pushed as single requests (POST /drinks,
+PATCH /drinks/<id>, DELETE /drinks/<id>, each verified and committed on
+its own) and as POST /drinks/batch requests of BATCH_SIZE operations.
+Each round creates CHANGES drinks, updates them and deletes them again.
+Like benchmarks.drinks_detail it runs on this machine, against a LocalIssuer
+and a scratch SQLite database with the default pragma profile. Run from
+the backend folder with
+
+  python -m benchmarks.drink_batch
+'''
+import os
+import tempfile
+import time
+
+from auth_kit.local_issuer import LocalIssuer
+
+CHANGES = 300
+BATCH_SIZE = 100
+
+
+def recipe(i):
+    return [
+        {'name': 'espresso', 'color': 'brown', 'parts': 1},
+        {'name': 'milk', 'color': 'white', 'parts': i % 3 + 1}
+    ]
+
+
+def single(client, headers, prefix):
+    ids = []
+    for i in range(CHANGES):
+        response = client.post('/drinks', headers=headers, json={'title': '{} {}'.format(prefix, i), 'recipe': recipe(i)})
+        ids.append(response.get_json()['drinks'][0]['id'])
+    for i, drink_id in enumerate(ids):
+        assert client.patch('/drinks/{}'.format(drink_id), headers=headers, json={'recipe': recipe(i + 1)}).status_code == 200
+    for drink_id in ids:
+        assert client.delete('/drinks/{}'.format(drink_id), headers=headers).status_code == 200
+
+
+def batch(client, headers, prefix):
+    def send(operations):
+        results = []
+        for start in range(0, len(operations), BATCH_SIZE):
+            response = client.post('/drinks/batch', headers=headers, json={'operations': operations[start:start + BATCH_SIZE]})
+            assert response.status_code == 200, response.get_json()
+            results += response.get_json()['results']
+        return results
+
+    ids = [result['id'] for result in send([
+        {'op': 'create', 'title': '{} {}'.format(prefix, i), 'recipe': recipe(i)} for i in range(CHANGES)])]
+    send([{'op': 'update', 'id': drink_id, 'recipe': recipe(i + 1)} for i, drink_id in enumerate(ids)])
+    send([{'op': 'delete', 'id': drink_id} for drink_id in ids])
+
+
+def main():
+    with LocalIssuer() as issuer, tempfile.TemporaryDirectory() as directory:
+        # both are read when src.api is imported
+        os.environ.update(issuer.environ)
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        from src.api import app
+
+        client = app.test_client()
+        headers = {'Authorization': 'Bearer ' + issuer.issue(['post:drinks', 'patch:drinks', 'delete:drinks'])}
+        client.get('/drinks')
+
+        print('{} creates, updates and deletes'.format(CHANGES))
+        for name, sync in (('single requests', single), ('batches of {}'.format(BATCH_SIZE), batch)):
+            start = time.perf_counter()
+            sync(client, headers, name)
+            elapsed = time.perf_counter() - start
+            print('{:<20} {:8.0f} operations/s'.format(name, 3 * CHANGES / elapsed))
+
+
+if __name__ == '__main__':
+    main()
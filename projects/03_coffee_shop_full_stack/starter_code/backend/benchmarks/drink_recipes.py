@@ -0,0 +1,89 @@
+'''
+Compares building the /drinks and /drinks-detail bodies the way api.py
+used to, loading every drink and parsing its JSON text recipe in
+short()/long() before encoding the list again, with Drink.json_list(),
+which copies the stored short_recipe and recipe JSON into the body as it
+is. Both tables live in a scratch SQLite database and hold DRINKS drinks;
+each timing starts from a fresh session. Inserts are timed too, since
+Drink validates recipes and writes short_recipe and drink_ingredient
+along with them. Run from the backend folder with
+
+  python -m benchmarks.drink_recipes
+'''
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import Column, String, Integer
+
+DRINKS = 10000
+ROUNDS = 5
+
+
+def recipe(i):
+    return [
+        {'name': 'espresso', 'color': 'brown', 'parts': 1},
+        {'name': 'milk', 'color': 'white', 'parts': i % 3 + 1},
+        {'name': 'foam', 'color': 'beige', 'parts': 1}
+    ]
+
+
+def measure(name, render):
+    from src.database.models import db
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        render()
+        db.session.remove()
+    elapsed = time.perf_counter() - start
+    print('{:<36} {:8.1f} ms per {} drinks'.format(name, elapsed / ROUNDS * 1000, DRINKS))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        # read when src.database.models is imported
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        from flask import Flask
+        from src.database.models import db, setup_db, Drink
+
+        class TextDrink(db.Model):
+            # the previous Drink: recipe as JSON text, decoded on every use
+            __tablename__ = 'text_drink'
+            id = Column(Integer, primary_key=True)
+            title = Column(String(80), unique=True)
+            recipe = Column(String(180), nullable=False)
+
+            def short(self):
+                short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
+                return {'id': self.id, 'title': self.title, 'recipe': short_recipe}
+
+            def long(self):
+                return {'id': self.id, 'title': self.title, 'recipe': json.loads(self.recipe)}
+
+        app = Flask(__name__)
+        setup_db(app)
+        with app.app_context():
+            db.create_all()
+
+            start = time.perf_counter()
+            db.session.add_all([TextDrink(title='drink {}'.format(i), recipe=json.dumps(recipe(i)))
+                                for i in range(DRINKS)])
+            db.session.commit()
+            text_insert = time.perf_counter() - start
+            start = time.perf_counter()
+            db.session.add_all([Drink(title='drink {}'.format(i), recipe=recipe(i)) for i in range(DRINKS)])
+            db.session.commit()
+            json_insert = time.perf_counter() - start
+            db.session.remove()
+            print('insert {} drinks: text {:.0f} ms, validated JSON {:.0f} ms'.format(
+                DRINKS, text_insert * 1000, json_insert * 1000))
+
+            measure('text recipe, short()', lambda: json.dumps([d.short() for d in TextDrink.query.all()]))
+            measure('json_list(Drink.short_recipe)', lambda: Drink.json_list(Drink.short_recipe))
+            measure('text recipe, long()', lambda: json.dumps([d.long() for d in TextDrink.query.all()]))
+            measure('json_list(Drink.recipe)', lambda: Drink.json_list(Drink.recipe))
+
+
+if __name__ == '__main__':
+    main()
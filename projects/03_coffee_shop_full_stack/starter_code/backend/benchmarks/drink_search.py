@@ -0,0 +1,70 @@
+'''
+Finding the drinks with a given ingredient: by loading every drink and
+looking through its recipe, the only way before drink_ingredient, and with
+Drink.with_ingredients(), which GET /drinks?ingredient= uses. Runs against
+a scratch SQLite database of DRINKS drinks, in which each searched
+ingredient appears in about one drink in a hundred. Run from the backend
+folder with
+
+  python -m benchmarks.drink_search
+'''
+import os
+import tempfile
+import time
+
+from sqlalchemy.orm import defer
+
+DRINKS = 10000
+SEARCHES = 20
+
+
+def recipe(i):
+    return [
+        {'name': 'espresso', 'color': 'brown', 'parts': 1},
+        {'name': 'syrup {}'.format(i % 100), 'color': 'amber', 'parts': 1},
+        {'name': 'milk', 'color': 'white', 'parts': i % 3 + 1}
+    ]
+
+
+def measure(name, search):
+    from src.database.models import db
+
+    start = time.perf_counter()
+    for i in range(SEARCHES):
+        drinks = search('Syrup {}'.format(i))
+        assert len(drinks) == DRINKS // 100
+        db.session.remove()
+    elapsed = time.perf_counter() - start
+    print('{:<28} {:8.2f} ms per search'.format(name, elapsed / SEARCHES * 1000))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        # read when src.database.models is imported
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        from flask import Flask
+        from src.database.models import db, setup_db, Drink
+
+        def scan(name):
+            name = name.strip().lower()
+            return [drink.short() for drink in Drink.query.order_by(Drink.id).all()
+                    if any(r['name'].strip().lower() == name for r in drink.recipe)]
+
+        def indexed(name):
+            return [drink.short() for drink in
+                    Drink.with_ingredients([name]).options(defer(Drink.recipe)).order_by(Drink.id).all()]
+
+        app = Flask(__name__)
+        setup_db(app)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Drink(title='drink {}'.format(i), recipe=recipe(i)) for i in range(DRINKS)])
+            Drink.commit()
+
+            print('{} drinks, {} matches per search'.format(DRINKS, DRINKS // 100))
+            measure('scan every recipe', scan)
+            measure('drink_ingredient index', indexed)
+
+
+if __name__ == '__main__':
+    main()
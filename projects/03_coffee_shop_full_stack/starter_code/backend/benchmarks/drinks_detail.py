@@ -0,0 +1,54 @@
+'''
+Load test of the requires_auth protected GET /drinks-detail, entirely on
+this machine: tokens are signed by a LocalIssuer whose JWKS is served from
+this process, and the API runs against a scratch SQLite database seeded
+with DRINKS drinks. Each of CLIENTS clients holds its own token, as
+browser sessions do. Run from the backend folder with
+
+  python -m benchmarks.drinks_detail
+'''
+import json
+import os
+import tempfile
+import time
+
+from auth_kit.local_issuer import LocalIssuer
+
+CLIENTS = 20
+DRINKS = 50
+REQUESTS = 2000
+
+
+def main():
+    with LocalIssuer() as issuer, tempfile.TemporaryDirectory() as directory:
+        # both are read when src.api is imported
+        os.environ.update(issuer.environ)
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        from src.api import app
+        from src.database.models import db, Drink
+
+        with app.app_context():
+            db.create_all()
+            for i in range(DRINKS):
+                Drink(title='drink {}'.format(i), recipe=json.dumps([
+                    {'name': 'espresso', 'color': 'brown', 'parts': 1},
+                    {'name': 'milk', 'color': 'white', 'parts': i % 3 + 1}
+                ])).insert()
+
+        client = app.test_client()
+        headers = [{'Authorization': 'Bearer ' + issuer.issue(['get:drinks-detail'], subject='client-{}'.format(i))}
+                   for i in range(CLIENTS)]
+        assert client.get('/drinks-detail', headers=headers[0]).status_code == 200
+        assert client.get('/drinks-detail', headers={
+            'Authorization': 'Bearer ' + issuer.issue(['post:drinks'])}).status_code == 403
+
+        start = time.perf_counter()
+        for i in range(REQUESTS):
+            client.get('/drinks-detail', headers=headers[i % CLIENTS])
+        elapsed = time.perf_counter() - start
+        print('GET /drinks-detail, {} drinks, {} clients: {:.0f} requests/s ({:.2f} ms each)'.format(
+            DRINKS, CLIENTS, REQUESTS / elapsed, elapsed / REQUESTS * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+Read throughput of a SQLite drinks database while other threads keep
+editing and deleting drinks, with SQLite's default journal and with the
+SQLITE_PRAGMAS profile of src/database/models.py. READERS threads run the
+GET /drinks query while WRITERS threads do what PATCH /drinks/<id> and
+DELETE /drinks/<id> do to the table (update a drink; delete one and add it
+back so the table keeps its size), each commit on its own. Every profile
+gets a fresh database file and the same pooled engine. Run from the
+backend folder with
+
+  python -m benchmarks.sqlite_concurrency
+'''
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.orm import defer, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from src.database.models import SQLITE_PRAGMAS, use_sqlite_pragmas, db, Drink
+
+DRINKS = 200
+READERS = 4
+WRITERS = 2
+SECONDS = 5
+
+
+def recipe(i):
+    return [
+        {'name': 'espresso', 'color': 'brown', 'parts': 1},
+        {'name': 'milk', 'color': 'white', 'parts': i % 3 + 1}
+    ]
+
+
+def run(name, path, pragmas):
+    engine = create_engine('sqlite:///' + path, poolclass=QueuePool, pool_size=READERS + WRITERS,
+                           connect_args={'check_same_thread': False})
+    if pragmas:
+        use_sqlite_pragmas(engine, pragmas)
+    # drink_ingredient too, the Drink listeners write to it
+    db.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine))
+    Session.add_all([Drink(title='drink {}'.format(i), recipe=recipe(i)) for i in range(DRINKS)])
+    Session.commit()
+    Session.remove()
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + SECONDS
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def read():
+        while time.perf_counter() < stop:
+            try:
+                [drink.short() for drink in Session.query(Drink).options(defer(Drink.recipe)).all()]
+                count('reads')
+            except exc.OperationalError:
+                count('errors')
+            Session.remove()
+
+    def write(offset):
+        i = offset
+        while time.perf_counter() < stop:
+            i += WRITERS
+            try:
+                drink = Session.query(Drink).filter(Drink.title == 'drink {}'.format(i % DRINKS)).one()
+                if i % 2:
+                    drink.recipe = recipe(i + 1)
+                else:
+                    Session.delete(drink)
+                    Session.flush()
+                    Session.add(Drink(title=drink.title, recipe=recipe(i)))
+                Session.commit()
+                count('writes')
+            except exc.OperationalError:
+                Session.rollback()
+                count('errors')
+            Session.remove()
+
+    threads = [threading.Thread(target=read) for _ in range(READERS)]
+    threads += [threading.Thread(target=write, args=(offset,)) for offset in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    print('{:<22} {:8.0f} reads/s {:8.0f} writes/s {:6} lock errors'.format(
+        name, counts['reads'] / SECONDS, counts['writes'] / SECONDS, counts['errors']))
+
+
+def main():
+    print('{} drinks, {} readers, {} writers, {} s per profile'.format(DRINKS, READERS, WRITERS, SECONDS))
+    with tempfile.TemporaryDirectory() as directory:
+        run('SQLite defaults', os.path.join(directory, 'default.db'), ())
+        run('SQLITE_PRAGMAS profile', os.path.join(directory, 'profile.db'), SQLITE_PRAGMAS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+Startup cost of the API: the time to import src.api, which is what a
+server pays before forking its workers, and the time of the first request,
+which runs bootstrap_db(), on a new database and on one that is already
+up to date. For comparison it also times db_drop_and_create_all(), which
+used to be uncommented in api.py to set the database up. Each measurement
+runs in a fresh interpreter against a scratch SQLite file; run from the
+backend folder with
+
+  python -m benchmarks.startup
+'''
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+
+IMPORT = '''
+import time
+start = time.perf_counter()
+import src.api
+print(time.perf_counter() - start)
+'''
+
+FIRST_REQUEST = '''
+import time
+from src.api import app
+client = app.test_client()
+start = time.perf_counter()
+assert client.get('/drinks').status_code == 200
+print(time.perf_counter() - start)
+'''
+
+DROP_AND_CREATE = '''
+import time
+from src.api import app
+from src.database.models import db_drop_and_create_all
+with app.app_context():
+    start = time.perf_counter()
+    db_drop_and_create_all()
+    print(time.perf_counter() - start)
+'''
+
+
+def measure(name, code, path, fresh):
+    timings = []
+    for _ in range(RUNS):
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        environ = dict(os.environ, DATABASE_URL='sqlite:///' + path)
+        output = subprocess.check_output([sys.executable, '-c', code], env=environ)
+        timings.append(float(output.decode().split()[-1]))
+    print('{:<40} {:8.1f} ms'.format(name, statistics.median(timings) * 1000))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'startup.db')
+        measure('import src.api', IMPORT, path, fresh=True)
+        assert not os.path.exists(path), 'importing src.api touched the database'
+        measure('first request, new database', FIRST_REQUEST, path, fresh=True)
+        measure('first request, existing database', FIRST_REQUEST, path, fresh=False)
+        measure('db_drop_and_create_all()', DROP_AND_CREATE, path, fresh=False)
+
+
+if __name__ == '__main__':
+    main()
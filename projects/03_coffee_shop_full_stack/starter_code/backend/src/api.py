@@ -3,80 +3,294 @@ from flask import Flask, request, jsonify, abort
 from sqlalchemy import exc
 import json
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
-from .auth.auth import AuthError, requires_auth
+from .database.models import db, bootstrap_db, setup_db, Drink
+from .auth.auth import AuthError, compile_permissions, current_token, requires_auth
+from .response_cache import ResponseCache
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
 
+# encoded drink lists, rebuilt when Drink.version changes
+drinks_cache = ResponseCache(lambda: Drink.version)
+
 '''
-@TODO uncomment the following line to initialize the datbase
-!! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
-!! NOTE THIS MUST BE UNCOMMENTED ON FIRST RUN
-!! Running this funciton will add one
+The database is brought up to date by bootstrap_db() before the first
+request, which creates missing tables and the demo drink but never drops
+anything, so importing this module (e.g. before a server forks its
+workers) does no database work. To start again from an empty database run
+
+    python -c "from src.api import app; from src.database.models import db_drop_and_create_all; app.app_context().push(); db_drop_and_create_all()"
+
+!! NOTE THIS WILL DROP ALL RECORDS
 '''
-# db_drop_and_create_all()
+
+
+@app.before_first_request
+def bootstrap_database():
+    bootstrap_db()
 
 # ROUTES
 '''
-@TODO implement endpoint
-    GET /drinks
-        it should be a public endpoint
-        it should contain only the drink.short() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-        or appropriate status code indicating reason for failure
+GET /drinks
+    it should be a public endpoint
+    it should contain only the drink.short() data representation
+    it is served from drinks_cache, with an ETag
+    ?ingredient=<name> and ?color=<color>, each repeatable, list only the
+    drinks having all of those ingredients and colors (ignoring case),
+    looked up in the drink_ingredient indexes; filtered lists are not
+    cached
+returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
+    or appropriate status code indicating reason for failure
+'''
+@app.route('/drinks')
+def get_drinks():
+    names, colors = request.args.getlist('ingredient'), request.args.getlist('color')
+    if names or colors:
+        return app.response_class(
+            drinks_body(Drink.json_list(Drink.short_recipe, Drink.with_ingredients(names, colors))),
+            mimetype='application/json')
+    return drinks_cache.response('short', lambda: drinks_body(Drink.json_list(Drink.short_recipe)))
+
+
+'''
+GET /drinks-detail
+    it should require the 'get:drinks-detail' permission
+    it should contain the drink.long() data representation
+    it is served from drinks_cache, with an ETag
+returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
+    or appropriate status code indicating reason for failure
+'''
+@app.route('/drinks-detail')
+@requires_auth('get:drinks-detail')
+def get_drinks_detail(payload):
+    return drinks_cache.response('long', lambda: drinks_body(Drink.json_list(Drink.recipe)), private=True)
+
+
+'''
+drinks_body(drinks)
+    the JSON text of {"success": True, "drinks": drinks} for the JSON text
+    of a drink list, see Drink.json_list
+'''
+
+
+def drinks_body(drinks):
+    return '{{"success":true,"drinks":{}}}'.format(drinks)
+
+
+'''
+set_drink_fields(drink, body, partial)
+    copies title and recipe from a request body onto the drink; both are
+    required unless partial, for updates
+    aborts with 400 for a malformed body and 422 for an invalid title or
+    recipe (see parse_recipe)
 '''
 
 
+def set_drink_fields(drink, body, partial=False):
+    if not isinstance(body, dict):
+        abort(400, 'the body must be a JSON object')
+    title, recipe = body.get('title'), body.get('recipe')
+    if not partial and (title is None or recipe is None):
+        abort(400, 'title and recipe are required')
+    if title is not None:
+        if not isinstance(title, str) or not title.strip():
+            abort(422, 'title must be a non-empty string')
+        drink.title = title
+    if recipe is not None:
+        try:
+            drink.recipe = recipe
+        except ValueError as e:
+            abort(422, str(e))
+
+
+def find_drink(drink_id):
+    drink = Drink.query.get(drink_id)
+    if drink is None:
+        abort(404, 'drink {} not found'.format(drink_id))
+    return drink
+
+
 '''
-@TODO implement endpoint
-    GET /drinks-detail
-        it should require the 'get:drinks-detail' permission
-        it should contain the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drinks} where drinks is the list of drinks
-        or appropriate status code indicating reason for failure
+POST /drinks
+    it should create a new row in the drinks table
+    it should require the 'post:drinks' permission
+    it should contain the drink.long() data representation
+returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly created drink
+    or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks', methods=['POST'])
+@requires_auth('post:drinks')
+def create_drink(payload):
+    drink = Drink()
+    set_drink_fields(drink, request.get_json(silent=True))
+    try:
+        drink.insert()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(422, 'a drink with this title already exists')
+    return jsonify({
+        'success': True,
+        'drinks': [drink.long()]
+    })
 
 
 '''
-@TODO implement endpoint
-    POST /drinks
-        it should create a new row in the drinks table
-        it should require the 'post:drinks' permission
-        it should contain the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the newly created drink
-        or appropriate status code indicating reason for failure
+PATCH /drinks/<id>
+    where <id> is the existing model id
+    it should respond with a 404 error if <id> is not found
+    it should update the corresponding row for <id>
+    it should require the 'patch:drinks' permission
+    it should contain the drink.long() data representation
+returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the updated drink
+    or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks/<int:drink_id>', methods=['PATCH'])
+@requires_auth('patch:drinks')
+def update_drink(payload, drink_id):
+    drink = find_drink(drink_id)
+    set_drink_fields(drink, request.get_json(silent=True), partial=True)
+    try:
+        drink.update()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(422, 'a drink with this title already exists')
+    return jsonify({
+        'success': True,
+        'drinks': [drink.long()]
+    })
 
 
 '''
-@TODO implement endpoint
-    PATCH /drinks/<id>
-        where <id> is the existing model id
-        it should respond with a 404 error if <id> is not found
-        it should update the corresponding row for <id>
-        it should require the 'patch:drinks' permission
-        it should contain the drink.long() data representation
-    returns status code 200 and json {"success": True, "drinks": drink} where drink an array containing only the updated drink
-        or appropriate status code indicating reason for failure
+DELETE /drinks/<id>
+    where <id> is the existing model id
+    it should respond with a 404 error if <id> is not found
+    it should delete the corresponding row for <id>
+    it should require the 'delete:drinks' permission
+returns status code 200 and json {"success": True, "delete": id} where id is the id of the deleted record
+    or appropriate status code indicating reason for failure
 '''
+@app.route('/drinks/<int:drink_id>', methods=['DELETE'])
+@requires_auth('delete:drinks')
+def delete_drink(payload, drink_id):
+    find_drink(drink_id).delete()
+    return jsonify({
+        'success': True,
+        'delete': drink_id
+    })
+
 
+# permission needed by each kind of batch operation
+BATCH_PERMISSIONS = {
+    'create': 'post:drinks',
+    'update': 'patch:drinks',
+    'delete': 'delete:drinks'
+}
+BATCH_LIMIT = 1000
 
 '''
-@TODO implement endpoint
-    DELETE /drinks/<id>
-        where <id> is the existing model id
-        it should respond with a 404 error if <id> is not found
-        it should delete the corresponding row for <id>
-        it should require the 'delete:drinks' permission
-    returns status code 200 and json {"success": True, "delete": id} where id is the id of the deleted record
-        or appropriate status code indicating reason for failure
+POST /drinks/batch
+    applies a list of drink changes in one transaction, e.g.
+        {"operations": [
+            {"op": "create", "title": "latte", "recipe": [...]},
+            {"op": "update", "id": 3, "recipe": [...]},
+            {"op": "delete", "id": 4}
+        ]}
+    validated like POST, PATCH and DELETE /drinks; the token is verified
+    once and must carry the permission of every kind of operation used
+    it applies all operations or none: the first failing one rolls the
+    batch back and is reported with its index
+    at most BATCH_LIMIT operations
+returns status code 200 and json {"success": True, "results": results} with, in order, {"op", "id", "drink"} for
+    creates and updates (drink in the drink.long() representation) and {"op", "id"} for deletes
+    or the failing operation's status code and json {"success": False, "error", "message", "operation": index}
 '''
+@app.route('/drinks/batch', methods=['POST'])
+@requires_auth()
+def batch_drinks(payload):
+    body = request.get_json(silent=True)
+    operations = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(operations, list) or not operations:
+        abort(400, 'operations must be a non-empty list')
+    if len(operations) > BATCH_LIMIT:
+        abort(400, 'at most {} operations per batch'.format(BATCH_LIMIT))
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_PERMISSIONS:
+            return batch_error(index, 400, 'op must be one of create, update, delete')
+    compile_permissions({BATCH_PERMISSIONS[operation['op']] for operation in operations})(
+        current_token().permissions)
+
+    # the drinks to update or delete, loaded with one query
+    ids = [operation.get('id') for operation in operations if operation['op'] != 'create']
+    drinks = {drink.id: drink for drink in Drink.query.filter(Drink.id.in_(
+        [drink_id for drink_id in ids if isinstance(drink_id, int)]))}
+
+    results = []
+    try:
+        for index, operation in enumerate(operations):
+            results.append(apply_operation(operation, drinks))
+        Drink.commit()
+    except HTTPException as e:
+        db.session.rollback()
+        return batch_error(index, e.code, e.description)
+    except exc.IntegrityError:
+        db.session.rollback()
+        return batch_error(index, 422, 'a drink with this title already exists')
+    return jsonify({
+        'success': True,
+        'results': results
+    })
+
+
+def apply_operation(operation, drinks):
+    kind = operation['op']
+    if kind == 'create':
+        drink = Drink()
+        set_drink_fields(drink, operation)
+        db.session.add(drink)
+        # assigns the id and checks the title is unique
+        db.session.flush()
+        return {'op': kind, 'id': drink.id, 'drink': drink.long()}
+
+    drink = drinks.get(operation.get('id'))
+    if drink is None:
+        abort(404, 'drink {} not found'.format(operation.get('id')))
+    if kind == 'delete':
+        db.session.delete(drink)
+        # before any later create reuses the title
+        db.session.flush()
+        del drinks[drink.id]
+        return {'op': kind, 'id': drink.id}
+    set_drink_fields(drink, operation, partial=True)
+    db.session.flush()
+    return {'op': kind, 'id': drink.id, 'drink': drink.long()}
+
+
+def batch_error(index, status_code, message):
+    return jsonify({
+        'success': False,
+        'error': status_code,
+        'message': message,
+        'operation': index
+    }), status_code
 
 
 # Error Handling
+'''
+error_message(error, default)
+    the description given to abort(code, description), or `default` when
+    there was none, rather than werkzeug's generic text for the code
+'''
+
+
+def error_message(error, default):
+    if error.description == type(error).description:
+        return default
+    return error.description
+
+
 '''
 Example error handling for unprocessable entity
 '''
@@ -87,7 +301,7 @@ def unprocessable(error):
     return jsonify({
         "success": False,
         "error": 422,
-        "message": "unprocessable"
+        "message": error_message(error, "unprocessable")
     }), 422
 
 
@@ -103,12 +317,45 @@ def unprocessable(error):
 '''
 
 '''
-@TODO implement error handler for 404
+error handler for 400
     error handler should conform to general task above
 '''
 
 
+@app.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+        "success": False,
+        "error": 400,
+        "message": error_message(error, "bad request")
+    }), 400
+
+
+'''
+error handler for 404
+    error handler should conform to general task above
+'''
+
+
+@app.errorhandler(404)
+def not_found(error):
+    return jsonify({
+        "success": False,
+        "error": 404,
+        "message": error_message(error, "resource not found")
+    }), 404
+
+
 '''
-@TODO implement error handler for AuthError
+error handler for AuthError
     error handler should conform to general task above
 '''
+
+
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify({
+        "success": False,
+        "error": error.status_code,
+        "message": error.error['description']
+    }), error.status_code
@@ -1,29 +1,36 @@
-import json
+import os
 from flask import request, _request_ctx_stack
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 
+from auth_kit.jwks import JWKSCache, JWKSError
+# AuthError, compile_permissions and check_permissions are shared with
+# BasicFlaskAuth, see auth_kit/permissions.py
+from auth_kit.permissions import AuthError, check_permissions, compile_permissions
+from auth_kit.token_cache import TokenCache, verify_token as verify_cached_token
 
-AUTH0_DOMAIN = 'udacity-fsnd.auth0.com'
+
+# all three can be pointed at a local_issuer.LocalIssuer to work offline
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'udacity-fsnd.auth0.com')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = 'dev'
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'dev')
+# or at a local jwks.json (path or file:// URL)
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
 
-## AuthError Exception
 '''
-AuthError Exception
-A standardized way to communicate auth failure modes
+the issuer's signing keys by kid, see auth_kit/jwks.py
 '''
-class AuthError(Exception):
-    def __init__(self, error, status_code):
-        self.error = error
-        self.status_code = status_code
+jwks_cache = JWKSCache(JWKS_URL)
 
+'''
+payloads of already verified tokens until they expire, see auth_kit/token_cache.py
+'''
+token_cache = TokenCache()
 
 ## Auth Header
 
 '''
-@TODO implement get_token_auth_header() method
+get_token_auth_header()
     it should attempt to get the header from the request
         it should raise an AuthError if no header is present
     it should attempt to split bearer and the token
@@ -31,29 +38,42 @@ class AuthError(Exception):
     return the token part of the header
 '''
 def get_token_auth_header():
-   raise Exception('Not Implemented')
+    auth = request.headers.get('Authorization', None)
+    if not auth:
+        raise AuthError({
+            'code': 'authorization_header_missing',
+            'description': 'Authorization header is expected.'
+        }, 401)
 
-'''
-@TODO implement check_permissions(permission, payload) method
-    @INPUTS
-        permission: string permission (i.e. 'post:drink')
-        payload: decoded jwt payload
+    parts = auth.split()
+    if parts[0].lower() != 'bearer':
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must start with "Bearer".'
+        }, 401)
 
-    it should raise an AuthError if permissions are not included in the payload
-        !!NOTE check your RBAC settings in Auth0
-    it should raise an AuthError if the requested permission string is not in the payload permissions array
-    return true otherwise
-'''
-def check_permissions(permission, payload):
-    raise Exception('Not Implemented')
+    elif len(parts) == 1:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Token not found.'
+        }, 401)
+
+    elif len(parts) > 2:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization header must be bearer token.'
+        }, 401)
+
+    return parts[1]
 
 '''
-@TODO implement verify_decode_jwt(token) method
+verify_decode_jwt(token)
     @INPUTS
         token: a json web token (string)
 
     it should be an Auth0 token with key id (kid)
-    it should verify the token using Auth0 /.well-known/jwks.json
+    it should verify the token using the Auth0 /.well-known/jwks.json keys,
+        looked up by kid in jwks_cache rather than fetched per request
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
@@ -61,26 +81,101 @@ def check_permissions(permission, payload):
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
 def verify_decode_jwt(token):
-    raise Exception('Not Implemented')
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+    except jwt.JWTError:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 401)
+    if 'kid' not in unverified_header:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Authorization malformed.'
+        }, 401)
+
+    try:
+        rsa_key = jwks_cache.get_key(unverified_header['kid'])
+    except JWKSError:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the keys to verify the token.'
+        }, 503)
+    if not rsa_key:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to find the appropriate key.'
+        }, 401)
+
+    try:
+        payload = jwt.decode(
+            token,
+            rsa_key,
+            algorithms=ALGORITHMS,
+            audience=API_AUDIENCE,
+            issuer='https://' + AUTH0_DOMAIN + '/'
+        )
+
+    except jwt.ExpiredSignatureError:
+        raise AuthError({
+            'code': 'token_expired',
+            'description': 'Token expired.'
+        }, 401)
+
+    except jwt.JWTClaimsError:
+        raise AuthError({
+            'code': 'invalid_claims',
+            'description': 'Incorrect claims. Please, check the audience and issuer.'
+        }, 401)
+
+    except Exception:
+        raise AuthError({
+            'code': 'invalid_header',
+            'description': 'Unable to parse authentication token.'
+        }, 401)
+
+    return payload
+
+'''
+verify_token(token)
+    verify_decode_jwt() behind token_cache: returns the VerifiedToken
+    (payload and permission set) of the token, verifying it only the first
+    time it is seen
+'''
+def verify_token(token):
+    return verify_cached_token(token_cache, token, verify_decode_jwt)
 
 '''
-@TODO implement @requires_auth(permission) decorator method
+@requires_auth(*permissions) decorator method
     @INPUTS
-        permission: string permission (i.e. 'post:drink')
+        permissions: string permissions (i.e. 'post:drink'), all of which
+            are required; wildcards are allowed, see compile_permissions
 
     it should use the get_token_auth_header method to get the token
-    it should use the verify_decode_jwt method to decode the jwt
-    it should use the check_permissions method validate claims and check the requested permission
+    it should use the verify_token method to decode the jwt
+    it should check the token's permissions against the requested permissions
     return the decorator which passes the decoded payload to the decorated method
+    the VerifiedToken is also kept for the request, see current_token()
 '''
-def requires_auth(permission=''):
+def requires_auth(*permissions):
+    check = compile_permissions(permissions)
+
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
+            verified = verify_token(token)
+            check(verified.permissions)
+            _request_ctx_stack.top.verified_token = verified
+            return f(verified.payload, *args, **kwargs)
 
         return wrapper
-    return requires_auth_decorator
\ No newline at end of file
+    return requires_auth_decorator
+
+'''
+current_token()
+    the VerifiedToken of the request, for views behind @requires_auth that
+    check further permissions themselves
+'''
+def current_token():
+    return _request_ctx_stack.top.verified_token
@@ -1,25 +1,96 @@
+import itertools
+import math
 import os
-from sqlalchemy import Column, String, Integer
+from numbers import Real
+import re
+from sqlalchemy import Column, String, Integer, JSON, Text, ForeignKey, Index, cast, event, exc, inspect
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, defer, validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+# DATABASE_URL overrides it, e.g. to run benchmarks against a scratch database
+database_path = os.environ.get('DATABASE_URL', "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
+'''
+SQLite connection profile
+    pragmas run on every new SQLite connection. WAL lets readers carry on
+    while a drink is written and, with synchronous=NORMAL, commits no
+    longer fsync the database file; writers wait up to busy_timeout ms for
+    each other instead of failing with "database is locked"; cache_size
+    (negative: KiB) and mmap_size keep hot pages in memory.
+
+    SQLITE_PRAGMAS overrides the profile, e.g.
+        SQLITE_PRAGMAS="journal_mode=DELETE,synchronous=FULL"
+    and an empty SQLITE_PRAGMAS keeps SQLite's defaults.
+'''
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', '5000'),
+    ('cache_size', '-16000'),
+    ('mmap_size', '268435456'),
+)
+
+
+def parse_pragmas(text):
+    pragmas = []
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, _, value = item.partition('=')
+        name, value = name.strip(), value.strip()
+        if not re.match(r'^\w+$', name) or not re.match(r'^-?\w+$', value):
+            raise ValueError('invalid SQLite pragma {!r}'.format(item))
+        pragmas.append((name, value))
+    return tuple(pragmas)
+
+
+def use_sqlite_pragmas(engine, pragmas):
+    '''
+    runs the pragmas on each connection the engine opens from now on
+    '''
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    SQLite databases get the SQLITE_PRAGMAS profile (or the one in the
+    SQLITE_PRAGMAS environment variable) and a connection pool, since
+    pragmas and the page cache only pay off on connections that are reused
 '''
 
 
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # setup_db() runs when api.py is imported, before any app config could
+    # be set, so the environment is the only way to change the profile
+    pragmas = parse_pragmas(os.environ['SQLITE_PRAGMAS']) if 'SQLITE_PRAGMAS' in os.environ else SQLITE_PRAGMAS
+    sqlite_file = database_path.startswith('sqlite:///') and database_path != 'sqlite:///:memory:'
+    if sqlite_file:
+        # SQLAlchemy opens a new connection per checkout for SQLite files;
+        # the pool hands each connection to one thread at a time
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'poolclass': QueuePool,
+            'connect_args': {'check_same_thread': False}
+        }
     db.app = app
     db.init_app(app)
+    if sqlite_file and pragmas:
+        with app.app_context():
+            use_sqlite_pragmas(db.engine, pragmas)
 
 
 '''
@@ -33,30 +104,276 @@ db_drop_and_create_all()
 def db_drop_and_create_all():
     db.drop_all()
     db.create_all()
-    # add one demo row which is helping in POSTMAN test
+    seed_demo_drinks()
+
+
+'''
+bootstrap_db()
+    brings the database up to date without touching existing data:
+    creates the tables that are missing, upgrades old drink tables and
+    adds the demo drink when there are no drinks at all
+    safe to run on every start, and by several workers at once
+'''
+
+
+def bootstrap_db():
+    try:
+        db.create_all()
+    except exc.OperationalError:
+        # another worker created a table between the check and the CREATE
+        db.create_all()
+    upgrade_drink_table()
+    index_drink_ingredients()
+    if db.session.query(Drink.id).first() is None:
+        try:
+            seed_demo_drinks()
+        except exc.IntegrityError:
+            # seeded by another worker
+            db.session.rollback()
+
+
+'''
+seed_demo_drinks()
+    adds one demo row which is helping in POSTMAN test
+'''
+
+
+def seed_demo_drinks():
     drink = Drink(
         title='water',
         recipe='[{"name": "water", "color": "blue", "parts": 1}]'
     )
 
+    drink.insert()
+
+
+'''
+upgrade_drink_table()
+    brings drink tables created before the JSON recipe columns up to date:
+    converts a PostgreSQL varchar recipe column to JSONB, adds the
+    short_recipe column and fills it in for the drinks that have none
+    yet; several workers may run it at once, the ones that lose the race
+    to add the column just go on
+'''
+
+
+def upgrade_drink_table():
+    if not db.engine.has_table('drink'):
+        return
+    columns = drink_columns()
+    if db.engine.dialect.name == 'postgresql' and not isinstance(columns['recipe'], JSON):
+        # recipes used to be JSON text in a varchar; SQLite keeps reading
+        # them as they are, PostgreSQL needs the column converted
+        db.session.execute('ALTER TABLE drink ALTER COLUMN recipe TYPE JSONB USING recipe::jsonb')
+        db.session.commit()
+    if 'short_recipe' not in columns:
+        column_type = Drink.__table__.c.short_recipe.type.compile(dialect=db.engine.dialect)
+        try:
+            db.session.execute('ALTER TABLE drink ADD COLUMN short_recipe {}'.format(column_type))
+        except (exc.OperationalError, exc.ProgrammingError):
+            # another worker added the column after drink_columns() was read
+            db.session.rollback()
+            if 'short_recipe' not in drink_columns():
+                raise
+    # only the drinks added before the column have no short_recipe, and
+    # whichever worker gets to them first fills them in
+    for drink in Drink.query.filter(Drink.short_recipe.is_(None)):
+        drink.short_recipe = recipe_colors(stored_recipe(drink.recipe))
+    db.session.commit()
+
+
+def drink_columns():
+    return {column['name']: column['type'] for column in inspect(db.engine).get_columns('drink')}
+
+
+def stored_recipe(recipe):
+    # recipes written before the JSON column may still come back as text
+    return json.loads(recipe) if isinstance(recipe, str) else recipe
+
+
+'''
+index_drink_ingredients()
+    fills drink_ingredient for databases whose drinks predate it; every
+    recipe has an ingredient, so drinks without any rows there are exactly
+    the ones that were never indexed
+'''
+
+
+def index_drink_ingredients():
+    try:
+        insert_missing_drink_ingredients()
+    except exc.IntegrityError:
+        # another worker indexed some of the same drinks first
+        db.session.rollback()
+        insert_missing_drink_ingredients()
+
+
+def insert_missing_drink_ingredients():
+    indexed = db.session.query(DrinkIngredient.drink_id)
+    rows = [
+        dict(row, drink_id=drink.id)
+        for drink in Drink.query.filter(~Drink.id.in_(indexed)).options(defer(Drink.short_recipe))
+        for row in ingredient_rows(stored_recipe(drink.recipe))
+    ]
+    if rows:
+        db.session.execute(DrinkIngredient.__table__.insert(), rows)
+        db.session.commit()
+
+
+'''
+parse_recipe(recipe)
+    returns the recipe as a list of ingredients, accepting the list itself,
+    a single ingredient or their JSON text
+    raises ValueError unless every ingredient is
+    {'name': string, 'color': string, 'parts': number} with finite parts > 0
+'''
+
+
+def parse_recipe(recipe):
+    if isinstance(recipe, str):
+        recipe = json.loads(recipe)
+    if isinstance(recipe, dict):
+        recipe = [recipe]
+    if not isinstance(recipe, list) or not recipe:
+        raise ValueError('recipe must be a non-empty list of ingredients')
+    ingredients = []
+    for ingredient in recipe:
+        if not isinstance(ingredient, dict):
+            raise ValueError('ingredients must be objects')
+        name, color, parts = ingredient.get('name'), ingredient.get('color'), ingredient.get('parts')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError('ingredient name must be a non-empty string')
+        if not isinstance(color, str) or not color.strip():
+            raise ValueError('ingredient color must be a non-empty string')
+        # NaN would pass `parts <= 0`
+        if isinstance(parts, bool) or not isinstance(parts, Real) or not math.isfinite(parts) or parts <= 0:
+            raise ValueError('ingredient parts must be a positive, finite number')
+        ingredients.append({'name': name, 'color': color, 'parts': parts})
+    return ingredients
+
+
+'''
+recipe_colors(recipe)
+    the short() form of a parsed recipe: its ingredients without names
+'''
+
+
+def recipe_colors(recipe):
+    return [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+
+
+'''
+ingredient_rows(recipe)
+    the drink_ingredient rows of a parsed recipe, without drink_id
+'''
+
+
+def ingredient_rows(recipe):
+    return [
+        {'position': position, 'name': ingredient_key(r['name']), 'color': ingredient_key(r['color'])}
+        for position, r in enumerate(recipe)
+    ]
+
+
+def ingredient_key(value):
+    # names and colors are matched ignoring case and surrounding spaces
+    return value.strip().lower()
 
-drink.insert()
 # ROUTES
 
+'''
+DrinkIngredient
+the ingredients of every drink's recipe, one row each, kept in step with
+Drink.recipe so drinks can be found by ingredient name or color through
+an index instead of reading every recipe
+'''
+
+
+class DrinkIngredient(db.Model):
+    __tablename__ = 'drink_ingredient'
+    __table_args__ = (
+        Index('ix_drink_ingredient_name', 'name', 'drink_id'),
+        Index('ix_drink_ingredient_color', 'color', 'drink_id'),
+    )
+
+    drink_id = Column(Integer, ForeignKey('drink.id', ondelete='CASCADE'), primary_key=True)
+    # index of the ingredient in the recipe
+    position = Column(Integer, primary_key=True)
+    # lower case, see ingredient_key()
+    name = Column(String, nullable=False)
+    color = Column(String, nullable=False)
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
 '''
 
+# source of Drink.version values
+drink_versions = itertools.count(1)
+
 
 class Drink(db.Model):
     # Autoincrementing, unique primary key
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients, stored as JSON (JSONB on Postgres)
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe = Column(String(180), nullable=False)
+    recipe = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+    # the short() projection of the recipe, computed whenever recipe is set
+    short_recipe = Column(JSON().with_variant(JSONB, 'postgresql'), nullable=False)
+
+    # bumped by insert(), update() and delete() once they have committed,
+    # so cached drink lists know they are stale
+    version = 0
+
+    '''
+    recipe validation
+        recipes are checked with parse_recipe() when they are assigned,
+        which raises ValueError for malformed recipes, and short_recipe and
+        the drink_ingredient rows (written with the drink, see below) are
+        derived from them at the same time
+    '''
+
+    @validates('recipe')
+    def validate_recipe(self, key, recipe):
+        recipe = parse_recipe(recipe)
+        self.short_recipe = recipe_colors(recipe)
+        self._ingredient_rows = ingredient_rows(recipe)
+        return recipe
+
+    '''
+    with_ingredients(names, colors)
+        query of the drinks that have an ingredient with each of the given
+        names and one with each of the given colors, answered from the
+        drink_ingredient indexes
+    '''
+
+    @classmethod
+    def with_ingredients(cls, names=(), colors=()):
+        query = cls.query
+        for column, values in ((DrinkIngredient.name, names), (DrinkIngredient.color, colors)):
+            for value in values:
+                query = query.filter(cls.id.in_(
+                    db.session.query(DrinkIngredient.drink_id).filter(column == ingredient_key(value))))
+        return query
+
+    '''
+    json_list(recipe_column, query)
+        the JSON text of the drinks of query (all of them by default) in id
+        order, each as {"id", "title", "recipe"} with the recipe copied as
+        stored in recipe_column: Drink.short_recipe gives the short() form
+        and Drink.recipe the long() one. No recipe is decoded or encoded
+        again, which is what loading Drink objects would cost per row.
+    '''
+
+    @classmethod
+    def json_list(cls, recipe_column, query=None):
+        rows = (query or cls.query).with_entities(cls.id, cls.title, cast(recipe_column, Text)).order_by(cls.id)
+        return '[{}]'.format(','.join(
+            '{{"id":{},"title":{},"recipe":{}}}'.format(drink_id, json.dumps(title), recipe)
+            for drink_id, title, recipe in rows))
 
     '''
     short()
@@ -64,12 +381,10 @@ class Drink(db.Model):
     '''
 
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': short_recipe
+            'recipe': self.short_recipe
         }
 
     '''
@@ -81,7 +396,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.recipe
         }
 
     '''
@@ -96,7 +411,7 @@ class Drink(db.Model):
 
     def insert(self):
         db.session.add(self)
-        db.session.commit()
+        Drink.commit()
 
     '''
     delete()
@@ -109,7 +424,7 @@ class Drink(db.Model):
 
     def delete(self):
         db.session.delete(self)
-        db.session.commit()
+        Drink.commit()
 
     '''
     update()
@@ -122,7 +437,52 @@ class Drink(db.Model):
     '''
 
     def update(self):
+        Drink.commit()
+
+    '''
+    commit()
+        commits the session and bumps Drink.version, once for however many
+        drinks were changed in it
+        EXAMPLE
+            db.session.add_all(drinks)
+            Drink.commit()
+    '''
+
+    @classmethod
+    def commit(cls):
         db.session.commit()
+        cls.version = next(drink_versions)
 
     def __repr__(self):
         return json.dumps(self.short())
+
+
+'''
+drink_ingredient upkeep
+    the rows of the drinks a flush inserted, or whose recipe it changed,
+    are written right after it, together with the removal of those of the
+    drinks it updated or deleted. They go through one Core executemany per
+    flush instead of DrinkIngredient objects, which would triple the
+    objects every drink write has to build and flush, or one statement
+    per drink.
+'''
+ingredient_table = DrinkIngredient.__table__
+
+
+@event.listens_for(Session, 'after_flush')
+def write_drink_ingredients(session, flush_context):
+    # session.new, dirty and deleted still hold what was just flushed;
+    # each of them builds a new set, so they are read once
+    inserted = [drink for drink in session.new if isinstance(drink, Drink)]
+    updated = [drink for drink in session.dirty if isinstance(drink, Drink) and '_ingredient_rows' in drink.__dict__]
+    stale = [drink.id for drink in updated]
+    stale += [drink.id for drink in session.deleted if isinstance(drink, Drink)]
+    rows = [dict(row, drink_id=drink.id) for drink in inserted + updated
+            for row in drink.__dict__.pop('_ingredient_rows', ())]
+    if not stale and not rows:
+        return
+    connection = session.connection()
+    if stale:
+        connection.execute(ingredient_table.delete().where(ingredient_table.c.drink_id.in_(stale)))
+    if rows:
+        connection.execute(ingredient_table.insert(), rows)
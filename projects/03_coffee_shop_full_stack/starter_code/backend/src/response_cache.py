@@ -0,0 +1,51 @@
+import hashlib
+import threading
+import time
+from flask import request, current_app
+
+'''
+ResponseCache
+    JSON responses that only change when the drinks do, e.g. GET /drinks.
+    Each entry holds the encoded body and its ETag together with the
+    Drink.version it was built from; while the version is unchanged,
+    requests get the stored bytes (or a 304 when the client already has
+    them) without loading or serializing a single drink.
+
+    Drink.version only sees writes made by this process, so entries are
+    also rebuilt after `ttl` seconds to pick up the other workers' writes.
+'''
+class ResponseCache(object):
+    def __init__(self, version, ttl=30):
+        # version() returns the current version of the cached data
+        self.version = version
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, build):
+        version = self.version()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            return entry
+        # one request rebuilds, the others wait for its result
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                return entry
+            body = build().encode('utf-8')
+            entry = (version, time.monotonic() + self.ttl, body, hashlib.sha1(body).hexdigest())
+            self._entries[key] = entry
+            return entry
+
+    def response(self, key, build, private=False):
+        '''
+        returns the cached response for key, calling build() for the JSON
+        text of a fresh payload when the entry is missing or stale; private
+        keeps shared caches from storing responses that require
+        authorization
+        '''
+        _, _, body, etag = self._get(key, build)
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+        return response.make_conditional(request)
@@ -0,0 +1,205 @@
+import os
+import tempfile
+import unittest
+
+from auth_kit.local_issuer import LocalIssuer
+
+issuer = None
+directory = None
+app = None
+
+
+def setUpModule():
+    """Point the API at a LocalIssuer and a scratch SQLite database.
+
+    Both are read when src.api is imported, so it is imported here rather
+    than at the top of the file; the tracked src/database/database.db is
+    never touched.
+    """
+    global issuer, directory, app
+    issuer = LocalIssuer().start()
+    directory = tempfile.TemporaryDirectory()
+    os.environ.update(issuer.environ)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory.name, 'test.db')
+    from src.api import app as api_app
+    app = api_app
+
+
+def tearDownModule():
+    from src.database.models import db
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    issuer.stop()
+    directory.cleanup()
+
+
+def recipe(*ingredients):
+    return [{'name': name, 'color': color, 'parts': parts} for name, color, parts in ingredients]
+
+
+LATTE = recipe(('Espresso', 'brown', 1), ('Milk', 'white', 2))
+MOCHA = recipe(('espresso', 'brown', 1), ('chocolate', 'brown', 1), ('milk', 'white', 1))
+TEA = recipe(('tea', 'amber', 1))
+
+
+class CoffeeShopTestCase(unittest.TestCase):
+    """The drink endpoints of src/api.py"""
+
+    def setUp(self):
+        """Start every test from the demo database: one drink, water."""
+        from src.database.models import db_drop_and_create_all
+        with app.app_context():
+            db_drop_and_create_all()
+        self.client = app.test_client()
+
+    def headers(self, *permissions):
+        return {'Authorization': 'Bearer ' + issuer.issue(permissions)}
+
+    def create(self, title, drink_recipe):
+        res = self.client.post('/drinks', json={'title': title, 'recipe': drink_recipe},
+                               headers=self.headers('post:drinks'))
+        self.assertEqual(res.status_code, 200)
+        return res.get_json()['drinks'][0]['id']
+
+    def titles(self, query=''):
+        res = self.client.get('/drinks' + query)
+        self.assertEqual(res.status_code, 200)
+        return [drink['title'] for drink in res.get_json()['drinks']]
+
+    def test_get_drinks_short_form(self):
+        self.create('latte', LATTE)
+        data = self.client.get('/drinks').get_json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(data['drinks'][1], {
+            'id': 2, 'title': 'latte', 'recipe': [{'color': 'brown', 'parts': 1}, {'color': 'white', 'parts': 2}]})
+
+    def test_get_drinks_not_modified(self):
+        res = self.client.get('/drinks')
+        again = self.client.get('/drinks', headers={'If-None-Match': res.headers['ETag']})
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(res.headers['Cache-Control'], 'no-cache')
+
+    def test_get_drinks_after_a_change(self):
+        etag = self.client.get('/drinks').headers['ETag']
+        self.create('latte', LATTE)
+        res = self.client.get('/drinks', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([drink['title'] for drink in res.get_json()['drinks']], ['water', 'latte'])
+
+    def test_get_drinks_detail(self):
+        self.create('latte', LATTE)
+        res = self.client.get('/drinks-detail', headers=self.headers('get:drinks-detail'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['drinks'][1]['recipe'], LATTE)
+        self.assertEqual(res.headers['Cache-Control'], 'private, no-cache')
+
+    def test_get_drinks_detail_without_permission(self):
+        self.assertEqual(self.client.get('/drinks-detail').status_code, 401)
+        res = self.client.get('/drinks-detail', headers=self.headers('post:drinks'))
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(res.get_json()['success'], False)
+
+    def test_filter_drinks_by_ingredient_and_color(self):
+        self.create('latte', LATTE)
+        self.create('mocha', MOCHA)
+        self.create('tea', TEA)
+
+        self.assertEqual(self.titles('?ingredient=MILK'), ['latte', 'mocha'])
+        self.assertEqual(self.titles('?ingredient=milk&ingredient=chocolate'), ['mocha'])
+        self.assertEqual(self.titles('?color=amber'), ['tea'])
+        self.assertEqual(self.titles('?ingredient=milk&color=amber'), [])
+
+    def test_filter_follows_updates_and_deletes(self):
+        latte = self.create('latte', LATTE)
+        tea = self.create('tea', TEA)
+        self.client.patch('/drinks/{}'.format(latte), json={'recipe': recipe(('oat milk', 'beige', 2))},
+                          headers=self.headers('patch:drinks'))
+        self.client.delete('/drinks/{}'.format(tea), headers=self.headers('delete:drinks'))
+
+        self.assertEqual(self.titles('?ingredient=milk'), [])
+        self.assertEqual(self.titles('?ingredient=oat milk'), ['latte'])
+        self.assertEqual(self.titles('?ingredient=tea'), [])
+
+    def test_create_drink_with_invalid_parts(self):
+        for parts in (0, -1, float('nan'), float('inf'), '2', True):
+            res = self.client.post('/drinks', json={'title': 'odd', 'recipe': recipe(('milk', 'white', parts))},
+                                   headers=self.headers('post:drinks'))
+
+            self.assertEqual(res.status_code, 422, parts)
+            self.assertEqual(res.get_json()['message'], 'ingredient parts must be a positive, finite number')
+
+    def test_update_missing_drink(self):
+        res = self.client.patch('/drinks/999', json={'title': 'ghost'}, headers=self.headers('patch:drinks'))
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(res.get_json()['message'], 'drink 999 not found')
+
+    def test_batch(self):
+        latte = self.create('latte', LATTE)
+        tea = self.create('tea', TEA)
+        res = self.client.post('/drinks/batch', json={'operations': [
+            {'op': 'create', 'title': 'mocha', 'recipe': MOCHA},
+            {'op': 'update', 'id': latte, 'title': 'flat white'},
+            {'op': 'delete', 'id': tea},
+        ]}, headers=self.headers('post:drinks', 'patch:drinks', 'delete:drinks'))
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result['op'] for result in data['results']], ['create', 'update', 'delete'])
+        self.assertEqual(data['results'][0]['drink']['recipe'], MOCHA)
+        self.assertEqual(self.titles(), ['water', 'flat white', 'mocha'])
+        self.assertEqual(self.titles('?ingredient=chocolate'), ['mocha'])
+
+    def test_batch_is_all_or_nothing(self):
+        res = self.client.post('/drinks/batch', json={'operations': [
+            {'op': 'create', 'title': 'mocha', 'recipe': MOCHA},
+            {'op': 'create', 'title': 'water', 'recipe': TEA},
+        ]}, headers=self.headers('post:drinks'))
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['operation'], 1)
+        self.assertEqual(self.titles(), ['water'])
+
+    def test_batch_with_invalid_parts(self):
+        res = self.client.post('/drinks/batch', json={'operations': [
+            {'op': 'create', 'title': 'mocha', 'recipe': MOCHA},
+            {'op': 'create', 'title': 'odd', 'recipe': recipe(('milk', 'white', float('nan')))},
+        ]}, headers=self.headers('post:drinks'))
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(res.get_json()['operation'], 1)
+        self.assertEqual(self.titles(), ['water'])
+
+    def test_batch_needs_every_permission(self):
+        res = self.client.post('/drinks/batch', json={'operations': [
+            {'op': 'create', 'title': 'mocha', 'recipe': MOCHA},
+            {'op': 'delete', 'id': 1},
+        ]}, headers=self.headers('post:drinks'))
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(self.titles(), ['water'])
+
+    def test_batch_with_unknown_operation(self):
+        res = self.client.post('/drinks/batch', json={'operations': [{'op': 'rename', 'id': 1}]},
+                               headers=self.headers('post:drinks'))
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.get_json()['operation'], 0)
+
+    def test_batch_without_operations(self):
+        res = self.client.post('/drinks/batch', json={'operations': []}, headers=self.headers('post:drinks'))
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.get_json()['message'], 'operations must be a non-empty list')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,9 @@
+from setuptools import setup
+
+# auth_kit, the token verification helpers shared by BasicFlaskAuth and
+# the coffee shop backend; both install it through their requirements.txt
+setup(
+    name='auth_kit',
+    version='0.1.0',
+    packages=['auth_kit'],
+)
@@ -0,0 +1,179 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from auth_kit import jwks, token_cache
+from auth_kit.jwks import JWKSCache, JWKSError
+from auth_kit.token_cache import TokenCache, verified_token, verify_token
+
+KEY = {'kty': 'RSA', 'kid': 'a', 'use': 'sig', 'n': 'n', 'e': 'AQAB'}
+
+
+class FakeJWKSCache(JWKSCache):
+    """A JWKSCache whose fetch() answers from `result` instead of the network.
+
+    `result` is a ({kid: key}, ttl) pair or an exception to raise; while
+    `gate` is not set, fetches block on it.
+    """
+
+    def __init__(self, result, **kwargs):
+        super().__init__('unused', **kwargs)
+        self.result = result
+        self.fetches = 0
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def fetch(self):
+        self.fetches += 1
+        self.gate.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class Clock(object):
+    """Stands in for time.monotonic() or time.time(), advanced by hand."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """The verified-token cache of auth_kit/token_cache.py"""
+
+    def setUp(self):
+        self.cache = TokenCache()
+        self.decoded = []
+
+    def decode(self, token):
+        self.decoded.append(token)
+        return {'sub': token, 'exp': 2000, 'permissions': ['get:drinks']}
+
+    def test_cache_hit_skips_verification(self):
+        with mock.patch.object(token_cache.time, 'time', Clock()):
+            first = verify_token(self.cache, 'token', self.decode)
+            second = verify_token(self.cache, 'token', self.decode)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.decoded, ['token'])
+        self.assertEqual(first.permissions, frozenset(['get:drinks']))
+
+    def test_token_expiring_in_the_cache_is_verified_again(self):
+        clock = Clock()
+        with mock.patch.object(token_cache.time, 'time', clock):
+            verify_token(self.cache, 'token', self.decode)
+            clock.now = 2000
+            self.assertIsNone(self.cache.get('token'))
+            self.assertEqual(len(self.cache), 0)
+            verify_token(self.cache, 'token', self.decode)
+
+        self.assertEqual(self.decoded, ['token', 'token'])
+
+    def test_tokens_without_expiry_are_not_cached(self):
+        self.cache.put('token', verified_token({'sub': 'token'}))
+
+        self.assertIsNone(self.cache.get('token'))
+
+    def test_least_recently_used_token_is_dropped(self):
+        cache = TokenCache(max_entries=2)
+        with mock.patch.object(token_cache.time, 'time', Clock()):
+            for token in ('a', 'b'):
+                verify_token(cache, token, self.decode)
+            cache.get('a')
+            verify_token(cache, 'c', self.decode)
+
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNone(cache.get('b'))
+
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """The signing key cache of auth_kit/jwks.py"""
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(jwks.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keys_are_fetched_once(self):
+        cache = FakeJWKSCache(({'a': KEY}, 60))
+
+        self.assertEqual(cache.get_key('a'), KEY)
+        self.clock.now += 30
+        self.assertEqual(cache.get_key('a'), KEY)
+        self.assertEqual(cache.fetches, 1)
+
+    def test_unknown_kid_refetches_at_most_once_per_interval(self):
+        cache = FakeJWKSCache(({'a': KEY}, 60))
+        cache.get_key('a')
+
+        self.assertIsNone(cache.get_key('b'))
+        self.assertIsNone(cache.get_key('c'))
+        self.assertEqual(cache.fetches, 1)
+
+    def test_failed_fetch_keeps_serving_stale_keys(self):
+        cache = FakeJWKSCache(({'a': KEY}, 60))
+        cache.get_key('a')
+        cache.result = OSError('issuer unreachable')
+        self.clock.now += 120
+
+        self.assertEqual(cache.get_key('a'), KEY)
+        self.assertEqual(cache.fetches, 2)
+        # and the issuer is not asked again right away
+        self.assertEqual(cache.get_key('a'), KEY)
+        self.assertEqual(cache.fetches, 2)
+
+    def test_failed_fetch_without_keys_raises(self):
+        cache = FakeJWKSCache(OSError('issuer unreachable'))
+
+        with self.assertRaises(JWKSError):
+            cache.get_key('a')
+        # later lookups fail fast until the next fetch is due
+        with self.assertRaises(JWKSError):
+            cache.get_key('a')
+        self.assertEqual(cache.fetches, 1)
+
+
+class JWKSCacheConcurrencyTestCase(unittest.TestCase):
+    """Lookups that arrive while a fetch is running"""
+
+    def lookup_concurrently(self, cache, callers=2):
+        results = []
+
+        def lookup():
+            try:
+                results.append(cache.get_key('a'))
+            except JWKSError:
+                results.append('JWKSError')
+
+        cache.gate.clear()
+        threads = [threading.Thread(target=lookup) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        # let every caller reach the fetch before it completes
+        time.sleep(0.1)
+        cache.gate.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_callers_share_one_fetch(self):
+        cache = FakeJWKSCache(({'a': KEY}, 60))
+
+        self.assertEqual(self.lookup_concurrently(cache), [KEY, KEY])
+        self.assertEqual(cache.fetches, 1)
+
+    def test_callers_waiting_on_a_failed_fetch_raise(self):
+        cache = FakeJWKSCache(OSError('issuer unreachable'))
+
+        self.assertEqual(self.lookup_concurrently(cache), ['JWKSError', 'JWKSError'])
+        self.assertEqual(cache.fetches, 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()